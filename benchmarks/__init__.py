@@ -0,0 +1 @@
+"""Reproducible benchmarks for the bot and the admin server (run with `python -m benchmarks.run`)"""
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+
+class FakeBotAPI:
+    """Minimal local stand-in for the Telegram Bot API
+
+    Answers getMe, sendMessage and the other methods the bot uses with
+    plausible JSON, after an artificial `latency` (seconds). A fraction
+    `rate_limit_ratio` of sendMessage calls fail with HTTP 429 and a
+    retry_after of `retry_after` seconds, like Telegram's flood control.
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit_ratio: float = 0.0, retry_after: int = 1, seed: int = 0):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self.rate_limited = 0
+        self._message_id = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}/bot'
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+
+    async def stop(self) -> None:
+        self._server.close()
+        # Idle keep-alive connections would otherwise outlive the server and the event loop
+        for writer in list(self._connections):
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections.values()), timeout=1.0)
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode().split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self._dispatch(path.rsplit('/', 1)[-1], headers.get('content-type', ''), body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def _parse(self, content_type: str, body: bytes) -> Dict:
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        params = {}
+        for key, value in parse_qsl(body.decode()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def _dispatch(self, method: str, content_type: str, body: bytes):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = self._parse(content_type, body)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}}
+        if method == 'sendMessage':
+            if self.rate_limit_ratio and self.random.random() < self.rate_limit_ratio:
+                self.rate_limited += 1
+                return 429, {
+                    'ok': False, 'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }
+            self._message_id += 1
+            return 200, {'ok': True, 'result': {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', ''),
+            }}
+        return 200, {'ok': True, 'result': True}
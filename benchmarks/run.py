@@ -0,0 +1,237 @@
+"""Benchmark the broadcast path, the command handlers and the admin API
+
+Run from the repository root:
+
+    python -m benchmarks.run --users 10000 --reminders 1000 --latency 0.02 --rate-limit-ratio 0.01
+
+Everything runs in a temporary directory against a fresh synthetic
+database and a local fake Bot API, and the results are printed as JSON
+(or written to --output) so runs can be compared between commits.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.seed import seed_database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Throughput and p50/p99 latency in milliseconds for per-operation timings in seconds"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'throughput_per_s': round(len(ordered) / total, 1) if total else None,
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def make_update(bot, user_id: int, text: str):
+    from telegram import Update
+
+    return Update.de_json({
+        'update_id': user_id,
+        'message': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'username': f'bench{user_id}'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+        },
+    }, bot)
+
+
+async def bench_broadcast(bot_module, bot, fake: FakeBotAPI, rate: float) -> Dict:
+    from delivery import DeliveryEngine
+
+    await bot_module.db.load_subscriber_index()
+    reminder_id = await bot_module.db.add_reminder('01/01/2099', '10:00', 'Benchmark *broadcast*', 'all')
+    reminder = await bot_module.db.get_reminder(reminder_id)
+
+    engine = DeliveryEngine(bot, global_rate=rate, per_chat_rate=1000)
+    sent_before = fake.calls.get('sendMessage', 0)
+    started = time.perf_counter()
+    await bot_module.send_reminder(engine, reminder)
+    elapsed = time.perf_counter() - started
+    await engine.stop()
+
+    recipients = len(await bot_module.db.get_recipient_ids(['all']))
+    return {
+        'recipients': recipients,
+        'seconds': round(elapsed, 3),
+        'throughput_per_s': round(recipients / elapsed, 1) if elapsed else None,
+        'send_calls': fake.calls.get('sendMessage', 0) - sent_before,
+        'rate_limited': fake.rate_limited,
+        'global_rate_limit': rate,
+    }
+
+
+# Messages whose rendering cost is compared: shared payloads, one render per category, one per recipient
+TEMPLATE_CASES = {
+    'static': 'Benchmark *broadcast*',
+    'category': 'Hello {category} students, the *quiz* closes soon',
+    'personalized': 'Hi {username} ({category}), the *quiz* closes in {countdown:01/01/2099 10:00}',
+}
+
+
+async def bench_templates(bot_module, iterations: int) -> Dict:
+    """Per-recipient cost of compiling and rendering reminder messages, excluding the profile query"""
+    from messages import CompiledMessage
+
+    user_ids = list(await bot_module.db.get_recipient_ids(['all']))
+    batch_size = bot_module.DELIVERY_BATCH_SIZE
+    batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+    profiles = [await bot_module.db.get_user_profiles(batch) for batch in batches]
+
+    results = {}
+    for name, text in TEMPLATE_CASES.items():
+        samples = []
+        for _ in range(max(iterations // 20, 1)):
+            started = time.perf_counter()
+            message = CompiledMessage(text)
+            for batch, batch_profiles in zip(batches, profiles):
+                message.render(batch, batch_profiles, time.time())
+            samples.append(time.perf_counter() - started)
+        best = min(samples)
+        results[name] = {
+            'recipients': len(user_ids),
+            'ms_per_broadcast': round(best * 1000, 3),
+            'us_per_recipient': round(best / max(len(user_ids), 1) * 1e6, 3),
+        }
+    return results
+
+
+async def bench_handlers(bot_module, bot, iterations: int) -> Dict:
+    results = {}
+    commands = [('start', bot_module.start, '/start'), ('set_category', bot_module.set_category, '/bsc'),
+                ('stop', bot_module.stop, '/stop')]
+    for name, handler, text in commands:
+        samples = []
+        for i in range(iterations):
+            update = make_update(bot, 900000000 + i, text)
+            started = time.perf_counter()
+            await handler(update, None)
+            samples.append(time.perf_counter() - started)
+        results[name] = latency_summary(samples)
+    return results
+
+
+def bench_admin_api(web_server, iterations: int) -> Dict:
+    client = web_server.app.test_client()
+    credentials = base64.b64encode(f"{os.environ['WEB_USERNAME']}:{os.environ['WEB_PASSWORD']}".encode()).decode()
+    headers = {'Authorization': f'Basic {credentials}', 'Accept-Encoding': 'gzip'}
+    results = {}
+    for name, url in [('reminders', '/api/reminders'), ('stats', '/api/stats')]:
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+        results[name] = latency_summary(samples)
+    return results
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    fake = FakeBotAPI(latency=args.latency, rate_limit_ratio=args.rate_limit_ratio, retry_after=args.retry_after)
+    await fake.start()
+
+    # The bot and the admin server read their settings from the environment when they start
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:benchmark')
+    os.environ.setdefault('WEB_USERNAME', 'bench')
+    os.environ.setdefault('WEB_PASSWORD', 'bench')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['METRICS_PORT'] = '0'
+
+    seed_started = time.perf_counter()
+    seed_database('data/reminders.db', args.users, args.reminders)
+    seed_seconds = time.perf_counter() - seed_started
+
+    import bot as bot_module
+    import web_server
+
+    bot_module.load_config()
+    bot_module.open_database()
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    bot = Bot(
+        os.environ['TELEGRAM_TOKEN'],
+        base_url=fake.base_url,
+        request=HTTPXRequest(connection_pool_size=args.connections, pool_timeout=30.0),
+    )
+    await bot.initialize()
+
+    results = {
+        'revision': git_revision(),
+        'parameters': vars(args),
+        'seed_seconds': round(seed_seconds, 3),
+        'admin_api': bench_admin_api(web_server, args.iterations),
+        'handlers': await bench_handlers(bot_module, bot, args.iterations),
+        'templates': await bench_templates(bot_module, args.iterations),
+        'broadcast': await bench_broadcast(bot_module, bot, fake, args.rate),
+    }
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    await bot.shutdown()
+    await fake.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='synthetic subscribers (1k to 1M)')
+    parser.add_argument('--reminders', type=int, default=1000, help='synthetic reminders')
+    parser.add_argument('--iterations', type=int, default=200, help='requests per handler / endpoint')
+    parser.add_argument('--latency', type=float, default=0.0, help='fake Bot API latency in seconds')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='fraction of sends answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after sent with injected 429s')
+    parser.add_argument('--rate', type=float, default=100000.0, help='global send rate limit for the broadcast')
+    parser.add_argument('--connections', type=int, default=64, help='HTTP connection pool size')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    sys.path.insert(0, REPO_ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        # bot.py and web_server.py use the relative path data/reminders.db
+        os.chdir(workdir)
+        results = asyncio.run(run(args))
+
+    report = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from database import IST, USER_UPSERT_SQL, VALID_CATEGORIES, Database
+
+CATEGORIES = sorted(VALID_CATEGORIES)
+
+
+def seed_database(db_path: str, users: int, reminders: int, seed: int = 0) -> Database:
+    """Create a database with `users` subscribers and `reminders` reminders spread over the next 30 days"""
+    rng = random.Random(seed)
+    database = Database(db_path)
+    conn = database.connection()
+    with conn:
+        conn.executemany(
+            USER_UPSERT_SQL,
+            ((100000 + i, f'user{i}', rng.choice(CATEGORIES)) for i in range(users))
+        )
+
+    now = datetime.now(IST)
+
+    def reminder_rows():
+        for i in range(reminders):
+            fire_time = now + timedelta(minutes=rng.randrange(1, 30 * 24 * 60))
+            categories = 'all' if rng.random() < 0.2 else ','.join(rng.sample(CATEGORIES, rng.randint(1, 2)))
+            recurrence = 'weekly' if rng.random() < 0.1 else None
+            yield (
+                fire_time.strftime('%d/%m/%Y'), fire_time.strftime('%H:%M'), f'Reminder {i}: *deadline* soon',
+                categories, recurrence,
+            )
+
+    database.add_reminders(reminder_rows())
+    return database
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Seed a reminders database with synthetic data')
+    parser.add_argument('--db', default='data/reminders.db')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--reminders', type=int, default=1000)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    seed_database(args.db, args.users, args.reminders)
+    print(f'Seeded {args.users} users and {args.reminders} reminders in {time.perf_counter() - started:.1f}s')
@@ -1,173 +1,104 @@
+from startup import StartupProfile  # isort: skip - must be the first import, see startup.py
 import logging
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
-from typing import List, Dict, Optional
+import time
+from typing import Dict, Optional, Tuple
 import asyncio
 import pytz
 from dotenv import load_dotenv
-import sqlite3
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 
-# Load environment variables from the new location
-load_dotenv('config/.env')
-TOKEN = os.getenv('TELEGRAM_TOKEN')
-if not TOKEN:
-    raise ValueError("No token found in environment variables")
-
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG,
-    handlers=[
-        logging.StreamHandler()
-    ]
+import metrics
+from change_notify import listen_for_changes
+from database import VALID_CATEGORIES, AsyncDatabase, Database, following_occurrence
+from delivery import BroadcastResult, DeliveryEngine
+from http_client import broadcast_bot, command_request, updates_request
+from logging_config import configure_logging
+from maintenance import DEFAULT_MAINTENANCE_INTERVAL, optimize_database, prune_and_archive, quiet_time
+from messages import PayloadCache
+from metrics import (
+    BROADCAST_TICK_SECONDS, HANDLER_SECONDS, MISSED_REMINDERS_TOTAL, SCHEDULER_LAG, SCHEDULER_LAG_SECONDS,
+    UPDATE_QUEUE_DEPTH, timed
 )
+from registrations import RegistrationBuffer
+from scheduler import SYNC_INTERVAL, ReminderScheduler
+from timezones import format_clock, get_zone, parse_clock
+
 logger = logging.getLogger(__name__)
+startup_profile = StartupProfile()
 
 # Set up the IST time zone
 IST = pytz.timezone('Asia/Kolkata')
 
-# Valid categories
-VALID_CATEGORIES = {'foundation', 'diploma', 'bsc', 'bs'}
+def load_config() -> None:
+    """Read config/.env, set up logging and read the settings below
 
-class Database:
-    def __init__(self, db_path: str = 'data/reminders.db'):
-        self.db_path = db_path
-        self.init_db()
+    Called by main() and create_application() rather than at import, so
+    importing this module reads no files and starts no logging thread.
+    """
+    global TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+    global WEBHOOK_MAX_CONNECTIONS, UPDATE_QUEUE_SIZE, CONCURRENT_UPDATES, TELEGRAM_BASE_URL, BOT_API_URL
+    global METRICS_PORT, METRICS_HOST, MISSED_REMINDER_POLICY, MISSED_REMINDER_GRACE
+    global DELIVERY_BATCH_SIZE, DELIVERY_SHARDS
 
-    def init_db(self) -> None:
-        """Initialize database with proper schema"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        # Check if database exists
-        db_exists = os.path.exists(self.db_path)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            if not db_exists:
-                logger.info("Creating new database with initial schema")
-            else:
-                logger.info("Checking and updating existing database schema")
-                
-            # Get existing tables
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            existing_tables = {row[0] for row in cursor.fetchall()}
-            
-            # Create or update users table
-            if 'users' not in existing_tables:
-                logger.info("Creating users table")
-                cursor.execute('''
-                    CREATE TABLE users (
-                        user_id INTEGER PRIMARY KEY,
-                        username TEXT,
-                        category TEXT CHECK(category IN ('foundation', 'diploma', 'bsc', 'bs')),
-                        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            
-            # Create or update reminders table
-            if 'reminders' not in existing_tables:
-                logger.info("Creating reminders table")
-                cursor.execute('''
-                    CREATE TABLE reminders (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        time TEXT NOT NULL,
-                        date TEXT NOT NULL,
-                        message TEXT NOT NULL,
-                        categories TEXT NOT NULL DEFAULT 'all',
-                        last_sent TIMESTAMP,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            else:
-                # Check if categories column exists in reminders table
-                cursor.execute("PRAGMA table_info(reminders)")
-                columns = {row[1] for row in cursor.fetchall()}
-                
-                if 'categories' not in columns:
-                    logger.info("Adding categories column to reminders table")
-                    cursor.execute('ALTER TABLE reminders ADD COLUMN categories TEXT NOT NULL DEFAULT "all"')
-                
-                if 'last_sent' not in columns:
-                    logger.info("Adding last_sent column to reminders table")
-                    cursor.execute('ALTER TABLE reminders ADD COLUMN last_sent TIMESTAMP')
-            
-            conn.commit()
-            logger.info("Database initialization completed successfully")
+    # Load environment variables from the new location
+    load_dotenv('config/.env')
+    TOKEN = os.getenv('TELEGRAM_TOKEN')
 
-    def add_user(self, user_id: int, username: Optional[str], category: str) -> None:
-        if category not in VALID_CATEGORIES:
-            raise ValueError(f"Invalid category: {category}")
-            
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT OR REPLACE INTO users (user_id, username, category) VALUES (?, ?, ?)',
-                (user_id, username, category.lower())
-            )
-            conn.commit()
-
-    def get_user_category(self, user_id: int) -> Optional[str]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT category FROM users WHERE user_id = ?', (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
-
-    def remove_user(self, user_id: int) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
-            conn.commit()
-
-    def get_all_users(self) -> List[tuple]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT user_id, username FROM users')
-            return cursor.fetchall()
-
-    def get_users_by_categories(self, categories: List[str]) -> List[tuple]:
-        categories = [cat.strip().lower() for cat in categories]
-        if 'all' in categories:
-            return self.get_all_users()
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            placeholders = ','.join('?' * len(categories))
-            cursor.execute(
-                f'SELECT user_id, username FROM users WHERE category IN ({placeholders})',
-                categories
-            )
-            return cursor.fetchall()
-
-    def get_all_reminders(self) -> List[Dict]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, time, date, message, categories, last_sent
-                FROM reminders
-                ORDER BY 
-                    date,
-                    CAST(substr(time, 1, 2) AS INTEGER) * 60 + CAST(substr(time, 4, 2) AS INTEGER)
-            ''')
-            return [dict(row) for row in cursor.fetchall()]
-
-    def update_reminder_sent(self, reminder_id: int, sent_time: str) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE reminders SET last_sent = ? WHERE id = ?',
-                (sent_time, reminder_id)
-            )
-            conn.commit()
+    # Configure logging
+    configure_logging()
+
+    # Update delivery: 'polling' (default) or 'webhook'
+    BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+    # Updates waiting to be processed; the webhook server applies back-pressure once it is full
+    UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))
+    # Number of updates handled at the same time
+    CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '256'))
+    # Point the bot at a different Bot API server, e.g. a local fake one for load testing
+    TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL')
+    BOT_API_URL = f"{TELEGRAM_BASE_URL.rstrip('/')}/bot" if TELEGRAM_BASE_URL else None
+
+    # Local Prometheus endpoint; set METRICS_PORT=0 to disable it
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
 
-# Initialize database
-db = Database()
+    # Reminders dispatched more than MISSED_REMINDER_GRACE seconds late (after downtime or a stalled loop)
+    # are either still sent ('send') or dropped ('expire')
+    MISSED_REMINDER_POLICY = os.getenv('MISSED_REMINDER_POLICY', 'send').lower()
+    MISSED_REMINDER_GRACE = float(os.getenv('MISSED_REMINDER_GRACE', '300'))
+    if MISSED_REMINDER_POLICY not in ('send', 'expire'):
+        raise ValueError("MISSED_REMINDER_POLICY must be 'send' or 'expire'")
 
+    # Number of outbox rows claimed and committed together
+    DELIVERY_BATCH_SIZE = int(os.getenv('DELIVERY_BATCH_SIZE', '500'))
+    # With DELIVERY_SHARDS > 0 the bot only fills the outbox and delivery_worker.py processes do the sending
+    DELIVERY_SHARDS = int(os.getenv('DELIVERY_SHARDS', '0'))
+
+# Rendered reminder messages, shared by every broadcast
+payload_cache = PayloadCache()
+
+# Set by open_database(), so importing this module opens no files
+db: Optional[AsyncDatabase] = None
+# Registration bursts are written in batches rather than one commit per command
+registrations: Optional[RegistrationBuffer] = None
+
+def open_database() -> AsyncDatabase:
+    """Open the database used by the handlers and the broadcast loop; queries run on a dedicated thread"""
+    global db, registrations
+    if db is None:
+        db = AsyncDatabase(Database())
+        registrations = RegistrationBuffer(db)
+    return db
+
+@timed(HANDLER_SECONDS, handler='help')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Help command handler - Show available commands and usage"""
     help_text = (
@@ -176,7 +107,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "/start - Start the bot and select your category\n"
         "/help - Show this help message\n"
         "/stop - Unsubscribe from reminders\n"
-        "/support - Show ways to support us\n\n"
+        "/support - Show ways to support us\n"
+        "/timezone - Set your timezone, e.g. `/timezone Europe/London`\n"
+        "/quiet - Hold reminders during quiet hours, e.g. `/quiet 22:00 07:00` or `/quiet off`\n\n"
         "*Category Commands*\n"
         "/foundation - Register as Foundation student\n"
         "/diploma - Register as Diploma student\n"
@@ -192,10 +125,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     
     try:
         await update.message.reply_text(help_text, parse_mode='Markdown')
-        logger.info(f"Help message sent to user {update.message.from_user.id}")
+        logger.info("Help message sent to user %s", update.message.from_user.id)
     except Exception as e:
-        logger.error(f"Error sending help message: {str(e)}", exc_info=True)
+        logger.error("Error sending help message: %s", e, exc_info=True)
 
+@timed(HANDLER_SECONDS, handler='support')
 async def support_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Support command handler - Show donation information"""
     support_text = (
@@ -212,18 +146,19 @@ async def support_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     try:
         await update.message.reply_text(support_text, parse_mode='Markdown')
-        logger.info(f"Support message sent to user {update.message.from_user.id}")
+        logger.info("Support message sent to user %s", update.message.from_user.id)
     except Exception as e:
-        logger.error(f"Error sending support message: {str(e)}", exc_info=True)
+        logger.error("Error sending support message: %s", e, exc_info=True)
 
+@timed(HANDLER_SECONDS, handler='start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Start command handler - Add user to the database"""
     try:
         user = update.message.from_user
-        logger.debug(f"Start command received from user {user.id} ({user.username})")
+        logger.debug("Start command received from user %s (%s)", user.id, user.username)
         
-        current_category = db.get_user_category(user.id)
-        logger.debug(f"Current category for user {user.id}: {current_category}")
+        current_category = await registrations.get_category(user.id)
+        logger.debug("Current category for user %s: %s", user.id, current_category)
         
         if current_category:
             message = (
@@ -240,8 +175,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             )
         else:
             # Add user with default category 'bs'
-            db.add_user(user.id, user.username, 'bs')
-            logger.info(f"Added new user {user.id} ({user.username}) with default category 'bs'")
+            registrations.set(user.id, user.username, 'bs')
+            logger.info("Added new user %s (%s) with default category 'bs'", user.id, user.username)
             
             message = (
                 "👋 Welcome to the *Reminder Bot*! 🎉\n\n"
@@ -257,23 +192,24 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 "/support - Show ways to support us"
             )
         
-        logger.debug(f"Attempting to send message to user {user.id}")
+        logger.debug("Attempting to send message to user %s", user.id)
         await update.message.reply_text(message, parse_mode='Markdown')
-        logger.info(f"Welcome message sent to user {user.id}")
+        logger.info("Welcome message sent to user %s", user.id)
     except Exception as e:
-        logger.error(f"Error in start command: {str(e)}", exc_info=True)
+        logger.error("Error in start command: %s", e, exc_info=True)
         await update.message.reply_text("An error occurred. Please try again later.")
 
+@timed(HANDLER_SECONDS, handler='set_category')
 async def set_category(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Set user category handler"""
     try:
         user = update.message.from_user
         category = update.message.text[1:]  # Remove the '/' from command
-        logger.debug(f"Set category command received: {category} from user {user.id} ({user.username})")
+        logger.debug("Set category command received: %s from user %s (%s)", category, user.id, user.username)
         
         try:
-            logger.debug(f"Attempting to add user {user.id} with category {category}")
-            db.add_user(user.id, user.username, category)
+            logger.debug("Attempting to add user %s with category %s", user.id, category)
+            registrations.set(user.id, user.username, category)
             message = (
                 f"✅ You've been registered as a *{category.upper()}* student!\n\n"
                 "You will receive reminders for your category.\n\n"
@@ -282,9 +218,9 @@ async def set_category(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 "/stop - Unsubscribe from reminders\n"
                 "/support - Show ways to support us"
             )
-            logger.info(f"Category {category} set successfully for user {user.id}")
+            logger.info("Category %s set successfully for user %s", category, user.id)
         except ValueError as e:
-            logger.error(f"Invalid category attempt from user {user.id}: {str(e)}")
+            logger.error("Invalid category attempt from user %s: %s", user.id, e)
             message = (
                 "❌ Invalid category. Please use one of these commands:\n\n"
                 "/foundation - Foundation student\n"
@@ -293,22 +229,23 @@ async def set_category(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 "/bs - BS student"
             )
         
-        logger.debug(f"Attempting to send message to user {user.id}")
+        logger.debug("Attempting to send message to user %s", user.id)
         await update.message.reply_text(message, parse_mode='Markdown')
-        logger.info(f"Message sent successfully to user {user.id}")
+        logger.info("Message sent successfully to user %s", user.id)
     except Exception as e:
-        logger.error(f"Error in set_category command: {str(e)}", exc_info=True)
+        logger.error("Error in set_category command: %s", e, exc_info=True)
         await update.message.reply_text("An error occurred. Please try again later.")
 
+@timed(HANDLER_SECONDS, handler='stop')
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Stop command handler - Remove user from the database"""
     try:
         user = update.message.from_user
-        logger.info(f"Stop command received from user {user.id} ({user.username})")
+        logger.info("Stop command received from user %s (%s)", user.id, user.username)
         
         # Get user's category before removing
-        current_category = db.get_user_category(user.id)
-        db.remove_user(user.id)
+        current_category = await registrations.get_category(user.id)
+        registrations.remove(user.id)
         
         message = (
             "👋 You've been unsubscribed from reminders.\n\n"
@@ -318,111 +255,339 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             "• Use `/help` to see all commands"
         )
         
-        logger.debug(f"Attempting to send message to user {user.id}")
+        logger.debug("Attempting to send message to user %s", user.id)
         await update.message.reply_text(message, parse_mode='Markdown')
-        logger.info(f"User {user.id} successfully unsubscribed")
+        logger.info("User %s successfully unsubscribed", user.id)
     except Exception as e:
-        logger.error(f"Error in stop command: {str(e)}", exc_info=True)
+        logger.error("Error in stop command: %s", e, exc_info=True)
         await update.message.reply_text("An error occurred. Please try again later.")
 
-async def broadcast_reminders(application: Application) -> None:
+@timed(HANDLER_SECONDS, handler='timezone')
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Timezone command handler - Show or set the zone quiet hours are read in"""
+    try:
+        user = update.message.from_user
+        preferences = await user_preferences(user.id)
+        if preferences is None:
+            message = "Please use /start to register first."
+        elif not context.args:
+            message = (
+                f"🌍 Your timezone is `{preferences[0] or get_zone().zone}`.\n\n"
+                "Change it with `/timezone Area/City`, for example `/timezone Europe/London`."
+            )
+        else:
+            try:
+                zone = get_zone(context.args[0])
+                await db.set_user_timezone(user.id, zone.zone)
+                message = f"✅ Your timezone is now `{zone.zone}`."
+                logger.info("Timezone %s set for user %s", zone.zone, user.id)
+            except ValueError:
+                message = "❌ Unknown timezone. Use a name like `Asia/Kolkata` or `America/New_York`."
+
+        await update.message.reply_text(message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Error in timezone command: %s", e, exc_info=True)
+        await update.message.reply_text("An error occurred. Please try again later.")
+
+@timed(HANDLER_SECONDS, handler='quiet')
+async def quiet_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Quiet command handler - Show, set or clear the hours reminders are held back"""
+    try:
+        user = update.message.from_user
+        preferences = await user_preferences(user.id)
+        usage = "Set them with `/quiet 22:00 07:00` (your local time) or turn them off with `/quiet off`."
+        if preferences is None:
+            message = "Please use /start to register first."
+        elif not context.args:
+            timezone, quiet_start, quiet_end = preferences
+            if quiet_start is None:
+                message = f"🔔 You have no quiet hours.\n\n{usage}"
+            else:
+                message = (
+                    f"🔕 Quiet hours: *{format_clock(quiet_start)}-{format_clock(quiet_end)}* "
+                    f"(`{timezone or get_zone().zone}`).\n\n{usage}"
+                )
+        elif context.args[0].lower() == 'off':
+            await db.set_quiet_hours(user.id, None, None)
+            message = "🔔 Quiet hours turned off."
+        else:
+            try:
+                quiet_start, quiet_end = (parse_clock(text) for text in ' '.join(context.args).replace('-', ' ').split())
+                await db.set_quiet_hours(user.id, quiet_start, quiet_end)
+                message = (
+                    f"🔕 Reminders due between *{format_clock(quiet_start)}* and *{format_clock(quiet_end)}* "
+                    "will be sent when your quiet hours end."
+                )
+                logger.info("Quiet hours set for user %s", user.id)
+            except ValueError:
+                message = f"❌ Invalid quiet hours. {usage}"
+
+        await update.message.reply_text(message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Error in quiet command: %s", e, exc_info=True)
+        await update.message.reply_text("An error occurred. Please try again later.")
+
+async def user_preferences(user_id: int) -> Optional[Tuple]:
+    """A registered user's (timezone, quiet_start, quiet_end), writing their buffered registration first"""
+    if await registrations.get_category(user_id) is None:
+        return None
+    await registrations.flush()
+    return await db.get_user_preferences(user_id)
+
+async def deliver_reminder(engine: DeliveryEngine, reminder: Dict) -> None:
+    """Drain a reminder's pending deliveries from the outbox in batches, waiting for users in quiet hours"""
+    # Rendered and validated once, then reused for every recipient
+    message = payload_cache.get(reminder)
+    while True:
+        summary = BroadcastResult()
+        while True:
+            user_ids = await db.claim_deliveries(reminder['id'], DELIVERY_BATCH_SIZE)
+            if not user_ids:
+                break
+            profiles = await db.get_user_profiles(user_ids) if message.personalized else {}
+            result = await engine.broadcast(user_ids, message.render(user_ids, profiles, time.time()))
+            # Commit the whole batch at once so a restart resumes after the last finished batch
+            await db.complete_deliveries(reminder['id'], result.outcomes)
+            summary.merge(result)
+
+        summary.finished = time.monotonic()
+        # One summary line per delivery bucket; individual sends are only logged at DEBUG
+        logger.info(
+            "Reminder %s delivered to %d/%d users in %.1fs (%.1f msg/s, %d failed, %d retries, errors: %s)",
+            reminder['id'], summary.sent, summary.total, summary.elapsed, summary.throughput,
+            summary.failed, summary.retries, summary.errors or 'none',
+            extra={
+                'reminder_id': reminder['id'], 'sent': summary.sent, 'failed': summary.failed,
+                'elapsed': round(summary.elapsed, 3),
+            }
+        )
+
+        # Recipients in quiet hours are sent to in later buckets, as each one's hours end
+        deliver_after = await db.next_deferred_delivery(reminder['id'])
+        if deliver_after is None:
+            return
+        await asyncio.sleep(max(0.0, deliver_after - time.time()))
+
+async def send_reminder(
+    engine: DeliveryEngine, reminder: Dict, scheduler: Optional[ReminderScheduler] = None
+) -> None:
+    """Send a single reminder to every user in its target categories"""
+    # Get target categories
+    categories = [cat.strip() for cat in reminder['categories'].split(',')]
+    user_ids = await db.get_recipient_ids(categories)
+
+    # Only the next occurrence of a series is stored; it replaces this one as it is sent
+    following = following_occurrence(reminder, time.time())
+
+    # Queue every recipient in the outbox before sending anything
+    deferred = await db.enqueue_deliveries(
+        reminder['id'], user_ids, datetime.now(IST).isoformat(), following, max(DELIVERY_SHARDS, 1)
+    )
+    if deferred:
+        logger.info("Reminder %s held back for %d users in their quiet hours", reminder['id'], deferred)
+    if following and scheduler is not None:
+        scheduler.add(reminder['id'], following[1])
+    if DELIVERY_SHARDS:
+        logger.info("Reminder %s queued for %d users across %d shards", reminder['id'], len(user_ids), DELIVERY_SHARDS)
+        return
+    await deliver_reminder(engine, reminder)
+
+async def expire_reminder(reminder: Dict, scheduler: ReminderScheduler) -> None:
+    """Skip a missed reminder; a recurring one moves on to its next occurrence"""
+    following = following_occurrence(reminder, time.time())
+    if following:
+        await db.reschedule_reminder(reminder['id'], following)
+        scheduler.add(reminder['id'], following[1])
+
+def start_task(tasks: set, coro) -> None:
+    """Run a broadcast in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+async def broadcast_reminders(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Main loop to handle broadcasting reminders"""
+    await db.load_subscriber_index()
+    scheduler = ReminderScheduler(db)
+    await scheduler.load()
+    # The web server pokes this socket on every change, so new reminders are scheduled immediately
+    try:
+        await listen_for_changes(scheduler.request_sync)
+    except OSError as e:
+        logger.warning("Reminder change notifications unavailable, polling every %ss: %s", SYNC_INTERVAL, e)
+    # Broadcasts use their own bot and connection pool so command replies never queue behind them
+    bot = context.job.data
+    await bot.initialize()
+    engine = DeliveryEngine(bot)
+    engine.start()
+    in_flight = set()
+
+    # Resume broadcasts that were interrupted by a restart; in sharded mode the workers do this
+    for reminder_id in [] if DELIVERY_SHARDS else await db.requeue_unfinished_deliveries():
+        reminder = await db.get_reminder(reminder_id)
+        if reminder:
+            logger.info("Resuming interrupted delivery of reminder %s", reminder_id)
+            start_task(in_flight, deliver_reminder(engine, reminder))
+
     while True:
+        tick_started = time.perf_counter()
         try:
-            now = datetime.now(IST)
-            reminders = db.get_all_reminders()
-            
-            for reminder in reminders:
-                try:
-                    reminder_time = datetime.strptime(f"{reminder['date']} {reminder['time']}", '%d/%m/%Y %H:%M')
-                    reminder_time = IST.localize(reminder_time)
-                    
-                    # Check if reminder hasn't been sent in the last minute
-                    last_sent = reminder.get('last_sent')
-                    if last_sent:
-                        last_sent = datetime.fromisoformat(last_sent)
-                        if (now - last_sent).total_seconds() < 60:
-                            continue
-
-                    time_diff = (reminder_time - now).total_seconds()
-                    if 0 <= time_diff <= 10:
-                        # Get target categories
-                        categories = [cat.strip() for cat in reminder['categories'].split(',')]
-                        users = db.get_users_by_categories(categories)
-                        
-                        for user_id, username in users:
-                            try:
-                                message = (
-                                    "⏰ *Reminder!*\n\n"
-                                    f"{reminder['message']}\n\n"
-                                    "_To stop receiving reminders, use /stop_"
-                                )
-                                await application.bot.send_message(
-                                    chat_id=user_id,
-                                    text=message,
-                                    parse_mode='Markdown'
-                                )
-                                logger.info(f"Sent reminder to {username} (ID: {user_id})")
-                            except Exception as e:
-                                logger.error(f"Failed to send reminder to {user_id}: {str(e)}")
-                        
-                        # Update last_sent time
-                        db.update_reminder_sent(reminder['id'], now.isoformat())
-                
-                except ValueError as e:
-                    logger.error(f"Error parsing reminder time: {str(e)}")
+            await scheduler.sync()
+
+            for reminder_id, fire_at in scheduler.pop_due(time.time()):
+                # The reminder may have been deleted or moved since it was scheduled
+                reminder = await db.get_reminder(reminder_id)
+                if not reminder or reminder['fire_at'] != fire_at:
                     continue
+                lag = time.time() - fire_at
+                SCHEDULER_LAG_SECONDS.set(lag)
+                SCHEDULER_LAG.observe(lag)
+
+                if lag > MISSED_REMINDER_GRACE:
+                    action = 'sent' if MISSED_REMINDER_POLICY == 'send' else 'expired'
+                    MISSED_REMINDERS_TOTAL.inc(action=action)
+                    logger.warning(
+                        "Reminder %s missed its fire time by %.0fs, %s", reminder_id, lag,
+                        'sending it now' if action == 'sent' else 'expiring it',
+                        extra={'reminder_id': reminder_id, 'lag': round(lag, 3)}
+                    )
+                    if action == 'expired':
+                        await expire_reminder(reminder, scheduler)
+                        continue
+                else:
+                    logger.info(
+                        "Reminder %s due, dispatching %.3fs after its fire time", reminder_id, lag,
+                        extra={'reminder_id': reminder_id, 'lag': round(lag, 3)}
+                    )
+                # Each broadcast runs on its own so one large fan-out does not hold up the next reminder
+                start_task(in_flight, send_reminder(engine, reminder, scheduler))
 
         except Exception as e:
-            logger.error(f"Error in broadcast loop: {str(e)}")
-        
-        await asyncio.sleep(10)
+            logger.error("Error in broadcast loop: %s", e)
+        BROADCAST_TICK_SECONDS.observe(time.perf_counter() - tick_started)
+
+        # Sleep until the next fire time exactly; rescheduling an earlier reminder or a change notification wakes the loop
+        await scheduler.wait()
+
+async def run_maintenance(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Prune unreachable users and archive fired reminders"""
+    try:
+        await prune_and_archive(db)
+    except Exception as e:
+        logger.error("Maintenance failed: %s", e, exc_info=True)
+
+async def run_quiet_hours_maintenance(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Refresh planner statistics and vacuum while few reminders are sent"""
+    try:
+        await optimize_database(db)
+    except Exception as e:
+        logger.error("Database optimization failed: %s", e, exc_info=True)
+
+async def flush_registrations(application: Application) -> None:
+    """Write buffered registrations before the process exits"""
+    await registrations.flush()
+
+def run_webhook(application: Application) -> None:
+    """Receive updates through PTB's embedded webhook server instead of long polling"""
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set in config/.env to use webhook mode")
+    if not WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET must be set in config/.env to use webhook mode")
+
+    logger.info("Starting webhook server on %s:%s/%s...", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH)
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+        # Requests without Telegram's X-Telegram-Bot-Api-Secret-Token header are rejected
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=[Update.MESSAGE],
+        drop_pending_updates=True
+    )
+
+def create_application() -> Application:
+    """Build the bot application with its handlers and background jobs; nothing is sent until it runs"""
+    load_config()
+    if not TOKEN:
+        raise ValueError("No token found in environment variables")
+    open_database()
+    startup_profile.mark('database')
+
+    # Build application with proper defaults
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        # Separate pools for long polling and command replies; broadcasts get a third one below
+        .get_updates_request(updates_request())
+        .request(command_request())
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .arbitrary_callback_data(True)
+        .post_shutdown(flush_registrations)
+    )
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+    application = builder.build()
+    UPDATE_QUEUE_DEPTH.set_function(application.update_queue.qsize)
+    logger.info("Application built successfully")
+
+    # Add handlers
+    logger.info("Adding command handlers...")
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stop", stop))
+    application.add_handler(CommandHandler("support", support_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
+    application.add_handler(CommandHandler("quiet", quiet_command))
+    
+    # Add category handlers
+    for category in VALID_CATEGORIES:
+        application.add_handler(CommandHandler(category, set_category))
+        logger.info("Added handler for /%s command", category)
+
+    logger.info("All handlers added successfully")
+
+    # Start the broadcast loop in the background
+    logger.info("Starting broadcast loop...")
+    application.job_queue.run_once(broadcast_reminders, 0, data=broadcast_bot(TOKEN, BOT_API_URL))
+    logger.info("Broadcast loop started")
+
+    # Background upkeep of the database
+    application.job_queue.run_repeating(
+        run_maintenance, int(os.getenv('MAINTENANCE_INTERVAL', DEFAULT_MAINTENANCE_INTERVAL)), first=60
+    )
+    application.job_queue.run_daily(run_quiet_hours_maintenance, quiet_time(IST))
+    startup_profile.mark('application')
+    return application
 
 def main() -> None:
     """Main function to run the bot"""
+    startup_profile.mark('imports')
+    load_config()
     try:
         logger.info("Starting the bot...")
-        logger.info(f"Using token: {TOKEN[:4]}...{TOKEN[-4:]}")
-        
-        # Build application with proper defaults
-        application = (
-            Application.builder()
-            .token(TOKEN)
-            .concurrent_updates(True)
-            .arbitrary_callback_data(True)
-            .build()
-        )
-        logger.info("Application built successfully")
-
-        # Add handlers
-        logger.info("Adding command handlers...")
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("stop", stop))
-        application.add_handler(CommandHandler("support", support_command))
-        
-        # Add category handlers
-        for category in VALID_CATEGORIES:
-            application.add_handler(CommandHandler(category, set_category))
-            logger.info(f"Added handler for /{category} command")
-
-        logger.info("All handlers added successfully")
-
-        # Start the broadcast loop in the background
-        logger.info("Starting broadcast loop...")
-        application.job_queue.run_once(broadcast_reminders, 0, application)
-        logger.info("Broadcast loop started")
-
-        # Start the bot with specific allowed updates
-        logger.info("Starting polling...")
-        application.run_polling(
-            allowed_updates=[Update.MESSAGE],
-            drop_pending_updates=True,
-            pool_timeout=10.0
-        )
+        application = create_application()
+        logger.info("Using token: %s...%s", TOKEN[:4], TOKEN[-4:])
+        if METRICS_PORT:
+            metrics.start_http_server(METRICS_PORT, METRICS_HOST)
+            startup_profile.mark('metrics')
+        startup_profile.report('Bot')
+
+        if BOT_MODE == 'webhook':
+            run_webhook(application)
+        else:
+            # Start the bot with specific allowed updates
+            logger.info("Starting polling...")
+            application.run_polling(
+                allowed_updates=[Update.MESSAGE],
+                drop_pending_updates=True,
+                pool_timeout=10.0
+            )
 
     except Exception as e:
-        logger.error(f"Critical error: {str(e)}", exc_info=True)
+        logger.error("Critical error: %s", e, exc_info=True)
         raise
 
 if __name__ == '__main__':
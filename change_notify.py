@@ -0,0 +1,59 @@
+"""Push notification of reminder changes from the web server to the bot
+
+The web server sends an empty datagram to a Unix socket the bot listens on
+whenever it adds or deletes reminders. The datagram carries no data: the
+bot's scheduler reacts by reading the reminder_changes log, which stays the
+source of truth. Sending never blocks or fails a request; if the bot is not
+listening the change is picked up by its next periodic sync.
+"""
+import logging
+import os
+import socket
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Set REMINDER_NOTIFY_SOCKET to an empty value to disable push and rely on periodic syncs
+DEFAULT_NOTIFY_SOCKET = 'data/scheduler.sock'
+
+
+def notify_socket_path() -> Optional[str]:
+    return os.getenv('REMINDER_NOTIFY_SOCKET', DEFAULT_NOTIFY_SOCKET) or None
+
+
+def notify_reminders_changed() -> None:
+    """Tell the bot to apply the reminder change log now; best effort"""
+    path = notify_socket_path()
+    if not path:
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b'', path)
+    except OSError as e:
+        # Bot not running, or a burst of notifications filled its queue: one pending wake-up is enough
+        logger.debug("Reminder change notification not delivered: %s", e)
+
+
+async def listen_for_changes(callback: Callable[[], None]) -> Optional['asyncio.DatagramTransport']:
+    """Call `callback` on the running loop for every change notification; None if push is disabled"""
+    # Only the bot listens; the web server imports this module just to send, without loading asyncio
+    import asyncio
+
+    class ChangeListener(asyncio.DatagramProtocol):
+        def datagram_received(self, data: bytes, addr) -> None:
+            callback()
+
+    path = notify_socket_path()
+    if not path:
+        return None
+    # A socket file left behind by a previous run would make the bind fail
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        ChangeListener, local_addr=path, family=socket.AF_UNIX
+    )
+    logger.info("Listening for reminder changes on %s", path)
+    return transport
@@ -0,0 +1,1215 @@
+import heapq
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pytz
+
+from metrics import DB_QUERY_SECONDS, timed
+from recurrence import DATE_FORMAT, RecurrenceRule, normalize_recurrence
+from timezones import Preferences, delivery_times
+
+logger = logging.getLogger(__name__)
+
+# Valid categories
+VALID_CATEGORIES = {'foundation', 'diploma', 'bsc', 'bs'}
+
+# Reminder dates and times are entered in IST
+IST = pytz.timezone('Asia/Kolkata')
+
+# Columns returned for reminder rows
+REMINDER_COLUMNS = 'id, time, date, message, categories, last_sent, fire_at, version, recurrence, occurrences'
+
+# Insert a user or update their username and category, keeping joined_at
+USER_UPSERT_SQL = '''
+    INSERT INTO users (user_id, username, category, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = excluded.username, category = excluded.category, updated_at = excluded.updated_at
+'''
+
+# Send errors after which a chat can never receive messages again (bot blocked, account deleted)
+PERMANENT_SEND_ERRORS = ('Forbidden',)
+
+# Seconds a writer waits for a lock held by the other process before failing
+BUSY_TIMEOUT = 5.0
+
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+
+def fire_timestamp(date: str, time_str: str, tz=IST) -> int:
+    """Convert a reminder's dd/mm/YYYY date and HH:MM time into a UTC epoch timestamp"""
+    fire_time = datetime.strptime(f"{date} {time_str}", '%d/%m/%Y %H:%M')
+    return int(tz.localize(fire_time).timestamp())
+
+
+def _next_occurrence(
+    recurrence: str, date: str, time_str: str, occurrence: int, after: float
+) -> Optional[Tuple[str, int, int]]:
+    """(date, fire_at, occurrence number) of the first occurrence after `after`, None once the series is over"""
+    rule = RecurrenceRule.parse(recurrence)
+    current = datetime.strptime(date, DATE_FORMAT).date()
+    while True:
+        current = rule.next_date(current, occurrence)
+        if current is None:
+            return None
+        occurrence += 1
+        date = current.strftime(DATE_FORMAT)
+        fire_at = fire_timestamp(date, time_str)
+        if fire_at > after:
+            return date, fire_at, occurrence
+
+
+def following_occurrence(reminder: Dict, now: float) -> Optional[Tuple[str, int, int]]:
+    """(date, fire_at, occurrence number) of a recurring reminder's next future occurrence"""
+    if not reminder.get('recurrence'):
+        return None
+    # Occurrences missed while the bot was down are skipped rather than sent in a burst
+    following = _next_occurrence(
+        reminder['recurrence'], reminder['date'], reminder['time'], reminder['occurrences'], now
+    )
+    if following is None:
+        logger.info("Reminder %s has fired its last occurrence", reminder['id'])
+    return following
+
+
+def _has_occurrence_after(
+    recurrence: Optional[str], date: str, time_str: str, occurrences: int, after: float
+) -> bool:
+    """SQL function used when archiving: whether a series still has an occurrence after `after`"""
+    return bool(recurrence) and _next_occurrence(recurrence, date, time_str, occurrences, after) is not None
+
+
+def normalize_categories(categories: str) -> str:
+    """Lower-case and strip a comma-separated category list"""
+    return ','.join(cat.strip().lower() for cat in categories.split(','))
+
+
+# Split a reminder's comma-separated categories into reminder_categories rows
+_CATEGORY_ROWS_SQL = '''
+    INSERT OR IGNORE INTO reminder_categories (reminder_id, category)
+    SELECT {reminder}.id, c.category
+    FROM (SELECT 'all' AS category UNION ALL SELECT 'foundation' UNION ALL SELECT 'diploma'
+          UNION ALL SELECT 'bsc' UNION ALL SELECT 'bs') AS c{source}
+    WHERE ',' || replace(lower({reminder}.categories), ' ', '') || ',' LIKE '%,' || c.category || ',%'
+'''
+
+
+def _migrate_base_schema(cursor: sqlite3.Cursor) -> None:
+    """Version 1: users, reminders and deliveries tables, upgrading pre-versioned databases in place"""
+    # Get existing tables
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    existing_tables = {row[0] for row in cursor.fetchall()}
+
+    # Create or update users table
+    if 'users' not in existing_tables:
+        logger.info("Creating users table")
+        cursor.execute('''
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                category TEXT CHECK(category IN ('foundation', 'diploma', 'bsc', 'bs')),
+                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    # Create or update reminders table
+    if 'reminders' not in existing_tables:
+        logger.info("Creating reminders table")
+        cursor.execute('''
+            CREATE TABLE reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                time TEXT NOT NULL,
+                date TEXT NOT NULL,
+                message TEXT NOT NULL,
+                categories TEXT NOT NULL DEFAULT 'all',
+                last_sent TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    else:
+        # Check if categories column exists in reminders table
+        cursor.execute("PRAGMA table_info(reminders)")
+        columns = {row[1] for row in cursor.fetchall()}
+
+        if 'categories' not in columns:
+            logger.info("Adding categories column to reminders table")
+            cursor.execute('ALTER TABLE reminders ADD COLUMN categories TEXT NOT NULL DEFAULT "all"')
+
+        if 'last_sent' not in columns:
+            logger.info("Adding last_sent column to reminders table")
+            cursor.execute('ALTER TABLE reminders ADD COLUMN last_sent TIMESTAMP')
+
+    # Create deliveries outbox table
+    if 'deliveries' not in existing_tables:
+        logger.info("Creating deliveries table")
+        cursor.execute('''
+            CREATE TABLE deliveries (
+                reminder_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending'
+                    CHECK(status IN ('pending', 'sending', 'sent', 'failed')),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (reminder_id, user_id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX idx_deliveries_status ON deliveries (status, reminder_id)')
+
+
+def _migrate_fire_at(cursor: sqlite3.Cursor) -> None:
+    """Version 2: indexed fire_at epoch column, reminder_categories join table and users(category) index"""
+    cursor.execute('ALTER TABLE reminders ADD COLUMN fire_at INTEGER')
+    cursor.execute('SELECT id, date, time FROM reminders')
+    updates = []
+    for reminder_id, date, time_str in cursor.fetchall():
+        try:
+            updates.append((fire_timestamp(date, time_str), reminder_id))
+        except ValueError:
+            logger.error("Reminder %s has an invalid date/time, leaving fire_at empty", reminder_id)
+    cursor.executemany('UPDATE reminders SET fire_at = ? WHERE id = ?', updates)
+    cursor.execute('CREATE INDEX idx_reminders_fire_at ON reminders (fire_at)')
+
+    cursor.execute('''
+        CREATE TABLE reminder_categories (
+            reminder_id INTEGER NOT NULL REFERENCES reminders (id) ON DELETE CASCADE,
+            category TEXT NOT NULL,
+            PRIMARY KEY (category, reminder_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX idx_reminder_categories_reminder ON reminder_categories (reminder_id)')
+    # Keep the join table in step with the comma-separated categories column
+    cursor.execute(f'''
+        CREATE TRIGGER reminders_categories_insert AFTER INSERT ON reminders
+        BEGIN
+            {_CATEGORY_ROWS_SQL.format(reminder='NEW', source='')};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER reminders_categories_update AFTER UPDATE OF categories ON reminders
+        BEGIN
+            DELETE FROM reminder_categories WHERE reminder_id = NEW.id;
+            {_CATEGORY_ROWS_SQL.format(reminder='NEW', source='')};
+        END
+    ''')
+    cursor.execute(_CATEGORY_ROWS_SQL.format(reminder='reminders', source=', reminders'))
+
+    cursor.execute('CREATE INDEX idx_users_category ON users (category)')
+
+
+def _migrate_reminder_version(cursor: sqlite3.Cursor) -> None:
+    """Version 3: per-reminder edit version, bumped whenever the message or categories change"""
+    cursor.execute('ALTER TABLE reminders ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    cursor.execute('''
+        CREATE TRIGGER reminders_version_update AFTER UPDATE OF message, categories ON reminders
+        BEGIN
+            UPDATE reminders SET version = version + 1 WHERE id = NEW.id;
+        END
+    ''')
+
+
+def _migrate_reminders_version_counter(cursor: sqlite3.Cursor) -> None:
+    """Version 4: table-wide reminders version counter, bumped by triggers on every visible change"""
+    cursor.execute('''
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT INTO meta (key, value) VALUES ('reminders_version', 1)")
+    bump = "UPDATE meta SET value = value + 1 WHERE key = 'reminders_version'"
+    cursor.execute(f'CREATE TRIGGER reminders_changed_insert AFTER INSERT ON reminders BEGIN {bump}; END')
+    cursor.execute(f'CREATE TRIGGER reminders_changed_delete AFTER DELETE ON reminders BEGIN {bump}; END')
+    cursor.execute(f'''
+        CREATE TRIGGER reminders_changed_update AFTER UPDATE OF date, time, message, categories, fire_at ON reminders
+        BEGIN {bump}; END
+    ''')
+
+
+def _migrate_recurrence(cursor: sqlite3.Cursor) -> None:
+    """Version 5: recurrence rule and count of occurrences fired so far, for repeating reminders"""
+    cursor.execute('ALTER TABLE reminders ADD COLUMN recurrence TEXT')
+    cursor.execute('ALTER TABLE reminders ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1')
+
+
+def _migrate_delivery_shards(cursor: sqlite3.Cursor) -> None:
+    """Version 6: shard column on deliveries plus worker heartbeats and shard leases for delivery workers"""
+    cursor.execute('ALTER TABLE deliveries ADD COLUMN shard INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX idx_deliveries_shard ON deliveries (shard, status)')
+    cursor.execute('''
+        CREATE TABLE delivery_workers (
+            worker_id TEXT PRIMARY KEY,
+            heartbeat_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE shard_leases (
+            shard INTEGER PRIMARY KEY,
+            owner TEXT,
+            expires_at REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _stats_delta(label: str, delta: int, name: str = 'users') -> str:
+    return f'''
+        INSERT INTO stats (name, label, value) VALUES ('{name}', {label}, {delta})
+        ON CONFLICT (name, label) DO UPDATE SET value = value + {delta}
+    '''
+
+
+def _migrate_stats(cursor: sqlite3.Cursor) -> None:
+    """Version 7: trigger-maintained user and reminder counts plus per-day delivery totals"""
+    cursor.execute('''
+        CREATE TABLE stats (
+            name TEXT NOT NULL,
+            label TEXT NOT NULL DEFAULT '',
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, label)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT INTO stats (name, label, value)
+        SELECT 'users', COALESCE(category, ''), COUNT(*) FROM users GROUP BY category
+    ''')
+    cursor.execute("INSERT INTO stats (name, label, value) SELECT 'reminders', '', COUNT(*) FROM reminders")
+
+    new_category, old_category = "COALESCE(NEW.category, '')", "COALESCE(OLD.category, '')"
+    cursor.execute(f'CREATE TRIGGER users_stats_insert AFTER INSERT ON users BEGIN {_stats_delta(new_category, 1)}; END')
+    cursor.execute(f'CREATE TRIGGER users_stats_delete AFTER DELETE ON users BEGIN {_stats_delta(old_category, -1)}; END')
+    cursor.execute(f'''
+        CREATE TRIGGER users_stats_update AFTER UPDATE OF category ON users
+        WHEN OLD.category IS NOT NEW.category
+        BEGIN
+            {_stats_delta(old_category, -1)};
+            {_stats_delta(new_category, 1)};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER reminders_stats_insert AFTER INSERT ON reminders
+        BEGIN {_stats_delta("''", 1, 'reminders')}; END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER reminders_stats_delete AFTER DELETE ON reminders
+        BEGIN {_stats_delta("''", -1, 'reminders')}; END
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE delivery_stats (
+            day TEXT PRIMARY KEY,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _migrate_maintenance(cursor: sqlite3.Cursor) -> None:
+    """Version 8: users.updated_at for safe pruning and an archive table for reminders that have fired"""
+    cursor.execute('ALTER TABLE users ADD COLUMN updated_at TIMESTAMP')
+    cursor.execute('UPDATE users SET updated_at = joined_at')
+    cursor.execute('''
+        CREATE TABLE reminders_archive (
+            id INTEGER PRIMARY KEY,
+            time TEXT NOT NULL,
+            date TEXT NOT NULL,
+            message TEXT NOT NULL,
+            categories TEXT NOT NULL,
+            last_sent TIMESTAMP,
+            created_at TIMESTAMP,
+            fire_at INTEGER,
+            recurrence TEXT,
+            occurrences INTEGER NOT NULL DEFAULT 1,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migrate_reminder_changes(cursor: sqlite3.Cursor) -> None:
+    """Version 9: change log of reminder inserts, reschedules and deletes, read by the bot's scheduler"""
+    cursor.execute('''
+        CREATE TABLE reminder_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            reminder_id INTEGER NOT NULL,
+            fire_at INTEGER,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    log = 'INSERT INTO reminder_changes (reminder_id, fire_at) VALUES'
+    cursor.execute(f'CREATE TRIGGER reminder_changes_insert AFTER INSERT ON reminders BEGIN {log} (NEW.id, NEW.fire_at); END')
+    cursor.execute(f'CREATE TRIGGER reminder_changes_delete AFTER DELETE ON reminders BEGIN {log} (OLD.id, NULL); END')
+    cursor.execute(f'''
+        CREATE TRIGGER reminder_changes_update AFTER UPDATE OF fire_at ON reminders
+        WHEN OLD.fire_at IS NOT NEW.fire_at
+        BEGIN {log} (NEW.id, NEW.fire_at); END
+    ''')
+
+
+def _migrate_user_preferences(cursor: sqlite3.Cursor) -> None:
+    """Version 10: per-user timezone and quiet hours, and the earliest time each delivery may be sent"""
+    cursor.execute('ALTER TABLE users ADD COLUMN timezone TEXT')
+    cursor.execute('ALTER TABLE users ADD COLUMN quiet_start INTEGER')
+    cursor.execute('ALTER TABLE users ADD COLUMN quiet_end INTEGER')
+    # Only the few users with quiet hours are read when a broadcast is queued
+    cursor.execute('CREATE INDEX idx_users_quiet ON users (user_id) WHERE quiet_start IS NOT NULL')
+    cursor.execute('ALTER TABLE deliveries ADD COLUMN deliver_after REAL NOT NULL DEFAULT 0')
+
+
+# (version, migration) pairs applied in order; PRAGMA user_version records the last one applied
+MIGRATIONS = [
+    (1, _migrate_base_schema),
+    (2, _migrate_fire_at),
+    (3, _migrate_reminder_version),
+    (4, _migrate_reminders_version_counter),
+    (5, _migrate_recurrence),
+    (6, _migrate_delivery_shards),
+    (7, _migrate_stats),
+    (8, _migrate_maintenance),
+    (9, _migrate_reminder_changes),
+    (10, _migrate_user_preferences),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# Pending SubscriberIndex change for a user who unsubscribed (None is a valid category)
+_UNSUBSCRIBED = object()
+
+
+def _contains(members: array, user_id: int) -> bool:
+    i = bisect_left(members, user_id)
+    return i < len(members) and members[i] == user_id
+
+
+class ConnectionPool:
+    """Persistent per-thread SQLite connections
+
+    Each thread gets one connection that stays open for the life of the
+    thread, so prepared statements are reused through sqlite3's statement
+    cache. Connections run in WAL mode, which lets the web server read while
+    the bot writes (and vice versa) instead of failing with
+    'database is locked'. Servers that start a thread per request call
+    release() when the request ends; connections left behind by threads
+    that have exited are closed when the next connection is opened.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=BUSY_TIMEOUT,
+                cached_statements=CACHED_STATEMENTS,
+                # Only the owning thread uses a connection, but close_all() may run on another one
+                check_same_thread=False,
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            with self._lock:
+                self._close_orphans()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def _close_orphans(self) -> None:
+        for thread in [thread for thread in self._connections if not thread.is_alive()]:
+            self._connections.pop(thread).close()
+
+    def release(self) -> None:
+        """Close the calling thread's connection; the next connection() call opens a new one"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.current_thread(), None)
+        conn.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections = {}
+        self._local = threading.local()
+
+
+class SubscriberIndex:
+    """In-memory category -> subscriber index
+
+    Each category maps to a sorted array('q') of user ids (8 bytes per user).
+    Subscribes and unsubscribes only record the user's new category; pending
+    changes are merged on the next read with one pass over each affected
+    category, so a burst of registrations costs one rebuild rather than one
+    array copy per user. Arrays are never modified in place: a snapshot
+    handed to a broadcast never changes underneath it and lookups of an
+    unchanged category return the same object without allocating.
+    """
+
+    def __init__(self):
+        self._members: Dict[Optional[str], array] = {}
+        self._snapshots: Dict[Tuple[Optional[str], ...], array] = {}
+        # user_id -> category to move the user to, or _UNSUBSCRIBED; applied by _merge()
+        self._pending: Dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._merge()
+            return sum(len(members) for members in self._members.values())
+
+    def load(self, rows: Iterable[Tuple[int, Optional[str]]]) -> None:
+        """Rebuild the index from (user_id, category) rows"""
+        buckets: Dict[Optional[str], List[int]] = {}
+        for user_id, category in rows:
+            buckets.setdefault(category, []).append(user_id)
+        with self._lock:
+            self._members = {category: array('q', sorted(ids)) for category, ids in buckets.items()}
+            self._snapshots = {}
+            self._pending = {}
+
+    def set(self, user_id: int, category: Optional[str]) -> None:
+        """Record that user_id is subscribed to category"""
+        with self._lock:
+            self._pending[user_id] = category
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            self._pending[user_id] = _UNSUBSCRIBED
+
+    def _merge(self) -> None:
+        """Apply pending changes, rebuilding only the categories they touch; the lock must be held"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        added: Dict[Optional[str], List[int]] = {}
+        for user_id, category in pending.items():
+            if category is not _UNSUBSCRIBED:
+                added.setdefault(category, []).append(user_id)
+
+        for category in set(self._members) | set(added):
+            members = self._members.get(category, array('q'))
+            new_ids = sorted(added.get(category, ()))
+            if not new_ids and not any(_contains(members, user_id) for user_id in pending):
+                continue
+            # Both inputs are sorted, so the merged array is too
+            kept = (user_id for user_id in members if user_id not in pending)
+            self._members[category] = array('q', heapq.merge(kept, new_ids))
+        self._snapshots = {}
+
+    def snapshot(self, categories: Iterable[str]) -> array:
+        """User ids subscribed to any of the categories ('all' means every user)"""
+        key = tuple(sorted({cat.strip().lower() for cat in categories}))
+        with self._lock:
+            self._merge()
+            if 'all' in key:
+                key = tuple(self._members)
+            if len(key) == 1:
+                return self._members.get(key[0], array('q'))
+
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                # Users have a single category, so the union is a plain concatenation
+                snapshot = array('q')
+                for category in key:
+                    snapshot.extend(self._members.get(category, ()))
+                self._snapshots[key] = snapshot
+            return snapshot
+
+
+class Database:
+    def __init__(self, db_path: str = 'data/reminders.db'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.pool = ConnectionPool(db_path)
+        # Only the bot loads the subscriber index; the web server queries users directly
+        self.subscribers: Optional[SubscriberIndex] = None
+        self.init_db()
+
+    def connection(self) -> sqlite3.Connection:
+        return self.pool.connection()
+
+    def init_db(self) -> None:
+        """Initialize database with proper schema and apply pending migrations"""
+        conn = self.connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        # Up to date, the usual case: one pragma read and no schema inspection
+        if version == SCHEMA_VERSION:
+            logger.debug("Database schema is up to date (version %s)", version)
+            return
+        if version > SCHEMA_VERSION:
+            logger.warning("Database schema version %s is newer than this code supports (%s)", version, SCHEMA_VERSION)
+            return
+
+        if version == 0:
+            logger.info("Creating new database with initial schema")
+        else:
+            logger.info("Checking and updating existing database schema (version %s)", version)
+
+        for target, migrate in MIGRATIONS:
+            if version >= target:
+                continue
+            # Each migration and its version bump commit together, or not at all. The bot, web server and
+            # workers often start together, so take the write lock first and re-read the version under it:
+            # another process may have applied this migration while we waited
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version >= target:
+                    continue
+                logger.info("Migrating database schema to version %s", target)
+                migrate(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {target}')
+            version = target
+
+        logger.info("Database initialization completed successfully")
+
+    @timed(DB_QUERY_SECONDS)
+    def add_user(self, user_id: int, username: Optional[str], category: str) -> None:
+        if category not in VALID_CATEGORIES:
+            raise ValueError(f"Invalid category: {category}")
+
+        conn = self.connection()
+        with conn:
+            conn.execute(USER_UPSERT_SQL, (user_id, username, category.lower()))
+        if self.subscribers is not None:
+            self.subscribers.set(user_id, category.lower())
+
+    @timed(DB_QUERY_SECONDS)
+    def apply_user_changes(
+        self, upserts: List[Tuple[int, Optional[str], str]], removals: List[int]
+    ) -> None:
+        """Write a batch of (user_id, username, category) upserts and user removals in one transaction"""
+        conn = self.connection()
+        with conn:
+            conn.executemany(USER_UPSERT_SQL, upserts)
+            conn.executemany('DELETE FROM users WHERE user_id = ?', ((user_id,) for user_id in removals))
+        if self.subscribers is not None:
+            for user_id, _, category in upserts:
+                self.subscribers.set(user_id, category)
+            for user_id in removals:
+                self.subscribers.remove(user_id)
+
+    @timed(DB_QUERY_SECONDS)
+    def get_user_category(self, user_id: int) -> Optional[str]:
+        cursor = self.connection().execute('SELECT category FROM users WHERE user_id = ?', (user_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    @timed(DB_QUERY_SECONDS)
+    def get_user_preferences(self, user_id: int) -> Optional[Preferences]:
+        """(timezone, quiet_start, quiet_end) of a registered user, None if they are not registered"""
+        cursor = self.connection().execute(
+            'SELECT timezone, quiet_start, quiet_end FROM users WHERE user_id = ?', (user_id,)
+        )
+        return cursor.fetchone()
+
+    @timed(DB_QUERY_SECONDS)
+    def set_user_timezone(self, user_id: int, timezone: Optional[str]) -> bool:
+        """Store a user's IANA timezone name; False if the user is not registered"""
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute('UPDATE users SET timezone = ? WHERE user_id = ?', (timezone, user_id))
+            return cursor.rowcount > 0
+
+    @timed(DB_QUERY_SECONDS)
+    def set_quiet_hours(self, user_id: int, quiet_start: Optional[int], quiet_end: Optional[int]) -> bool:
+        """Store a user's quiet hours in minutes after local midnight, or clear them with None; False if not registered"""
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                'UPDATE users SET quiet_start = ?, quiet_end = ? WHERE user_id = ?',
+                (quiet_start, quiet_end, user_id)
+            )
+            return cursor.rowcount > 0
+
+    @timed(DB_QUERY_SECONDS)
+    def get_user_profiles(self, user_ids: Sequence[int]) -> Dict[int, Tuple[Optional[str], Optional[str]]]:
+        """(username, category) for each of a batch of users, for personalized reminders"""
+        if not user_ids:
+            return {}
+        placeholders = ','.join('?' * len(user_ids))
+        cursor = self.connection().execute(
+            f'SELECT user_id, username, category FROM users WHERE user_id IN ({placeholders})', tuple(user_ids)
+        )
+        return {user_id: (username, category) for user_id, username, category in cursor}
+
+    def _quiet_hours_preferences(self) -> Dict[int, Preferences]:
+        cursor = self.connection().execute(
+            'SELECT user_id, timezone, quiet_start, quiet_end FROM users WHERE quiet_start IS NOT NULL'
+        )
+        return {user_id: (timezone, start, end) for user_id, timezone, start, end in cursor}
+
+    @timed(DB_QUERY_SECONDS)
+    def remove_user(self, user_id: int) -> None:
+        conn = self.connection()
+        with conn:
+            conn.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
+        if self.subscribers is not None:
+            self.subscribers.remove(user_id)
+
+    @timed(DB_QUERY_SECONDS)
+    def get_all_users(self) -> List[tuple]:
+        cursor = self.connection().execute('SELECT user_id, username FROM users')
+        return cursor.fetchall()
+
+    @timed(DB_QUERY_SECONDS)
+    def get_users_by_categories(self, categories: List[str]) -> List[tuple]:
+        categories = [cat.strip().lower() for cat in categories]
+        if 'all' in categories:
+            return self.get_all_users()
+
+        placeholders = ','.join('?' * len(categories))
+        cursor = self.connection().execute(
+            f'SELECT user_id, username FROM users WHERE category IN ({placeholders})',
+            categories
+        )
+        return cursor.fetchall()
+
+    @timed(DB_QUERY_SECONDS)
+    def load_subscriber_index(self) -> None:
+        """Build the in-memory category index that add_user and remove_user keep up to date"""
+        index = SubscriberIndex()
+        index.load(self.connection().execute('SELECT user_id, category FROM users'))
+        self.subscribers = index
+        logger.info("Subscriber index loaded with %s users", len(index))
+
+    def get_recipient_ids(self, categories: List[str]) -> Sequence[int]:
+        """User ids for a reminder's categories, from the subscriber index when it is loaded"""
+        if self.subscribers is not None:
+            return self.subscribers.snapshot(categories)
+        return [user_id for user_id, _ in self.get_users_by_categories(categories)]
+
+    def _fetch_dicts(self, query: str, params: tuple = ()) -> List[Dict]:
+        cursor = self.connection().cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    @timed(DB_QUERY_SECONDS)
+    def get_all_reminders(self) -> List[Dict]:
+        return self._fetch_dicts(f'''
+            SELECT {REMINDER_COLUMNS}
+            FROM reminders
+            ORDER BY fire_at, id
+        ''')
+
+    @timed(DB_QUERY_SECONDS)
+    def get_upcoming_reminders(self, since: float, until: Optional[float] = None) -> List[Dict]:
+        """Reminders firing at or after the given epoch timestamp (and before `until`), in firing order"""
+        if until is None:
+            return self._fetch_dicts(
+                f'SELECT {REMINDER_COLUMNS} FROM reminders WHERE fire_at >= ? ORDER BY fire_at',
+                (since,)
+            )
+        return self._fetch_dicts(
+            f'SELECT {REMINDER_COLUMNS} FROM reminders WHERE fire_at >= ? AND fire_at < ? ORDER BY fire_at',
+            (since, until)
+        )
+
+    @timed(DB_QUERY_SECONDS)
+    def get_overdue_recurring_reminders(self, before: float) -> List[Dict]:
+        """Recurring reminders whose stored occurrence is older than `before`, oldest first"""
+        return self._fetch_dicts(
+            f'SELECT {REMINDER_COLUMNS} FROM reminders WHERE fire_at < ? AND recurrence IS NOT NULL ORDER BY fire_at',
+            (before,)
+        )
+
+    @timed(DB_QUERY_SECONDS)
+    def get_reminders_version(self) -> int:
+        """Counter that changes whenever any reminder is added, edited or deleted"""
+        cursor = self.connection().execute("SELECT value FROM meta WHERE key = 'reminders_version'")
+        return cursor.fetchone()[0]
+
+    @timed(DB_QUERY_SECONDS)
+    def list_reminders(
+        self,
+        limit: int,
+        after: Optional[Tuple[int, int]] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        category: Optional[str] = None,
+    ) -> List[Dict]:
+        """One page of reminders in firing order, continuing after the (fire_at, id) keyset cursor"""
+        conditions = []
+        params: list = []
+        if after is not None:
+            conditions.append('(fire_at, id) > (?, ?)')
+            params.extend(after)
+        if since is not None:
+            conditions.append('fire_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('fire_at < ?')
+            params.append(until)
+        if category is not None:
+            conditions.append(
+                "id IN (SELECT reminder_id FROM reminder_categories WHERE category IN (?, 'all'))"
+            )
+            params.append(category)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        params.append(limit)
+        return self._fetch_dicts(
+            f'SELECT id, time, date, message, categories, recurrence, fire_at FROM reminders {where} '
+            'ORDER BY fire_at, id LIMIT ?',
+            tuple(params)
+        )
+
+    @timed(DB_QUERY_SECONDS)
+    def get_last_change_seq(self) -> int:
+        cursor = self.connection().execute('SELECT COALESCE(MAX(seq), 0) FROM reminder_changes')
+        return cursor.fetchone()[0]
+
+    @timed(DB_QUERY_SECONDS)
+    def get_reminder_changes(self, after_seq: int) -> List[Tuple[int, int, Optional[int]]]:
+        """(seq, reminder_id, fire_at) for every change after `after_seq`; fire_at is None for a delete"""
+        cursor = self.connection().execute(
+            'SELECT seq, reminder_id, fire_at FROM reminder_changes WHERE seq > ? ORDER BY seq',
+            (after_seq,)
+        )
+        return cursor.fetchall()
+
+    @timed(DB_QUERY_SECONDS)
+    def trim_reminder_changes(self, keep_seconds: float) -> int:
+        """Drop change log entries older than `keep_seconds`; a running scheduler has applied them long ago"""
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM reminder_changes WHERE changed_at < datetime('now', ?)",
+                (f'-{int(keep_seconds)} seconds',)
+            )
+            return cursor.rowcount
+
+    @timed(DB_QUERY_SECONDS)
+    def get_reminder(self, reminder_id: int) -> Optional[Dict]:
+        rows = self._fetch_dicts(
+            f'SELECT {REMINDER_COLUMNS} FROM reminders WHERE id = ?',
+            (reminder_id,)
+        )
+        return rows[0] if rows else None
+
+    @timed(DB_QUERY_SECONDS)
+    def add_reminder(
+        self, date: str, time_str: str, message: str, categories: str, recurrence: Optional[str] = None
+    ) -> int:
+        """Insert a reminder; raises ValueError if the date, time or recurrence rule is malformed"""
+        fire_at = fire_timestamp(date, time_str)
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO reminders (date, time, message, categories, fire_at, recurrence) VALUES (?, ?, ?, ?, ?, ?)',
+                (date, time_str, message, normalize_categories(categories), fire_at, normalize_recurrence(recurrence))
+            )
+            return cursor.lastrowid
+
+    @timed(DB_QUERY_SECONDS)
+    def add_reminders(
+        self,
+        rows: Iterable[Tuple[str, str, str, str, Optional[str]]],
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> int:
+        """Insert (date, time, message, categories, recurrence) rows in a single transaction
+
+        Rows are consumed lazily, so a generator over a streamed upload is
+        never held in memory. With on_error, a row the database rejects is
+        reported through it and skipped instead of rolling back the others.
+        Returns the number of rows inserted.
+        """
+        conn = self.connection()
+        inserted = 0
+        with conn:
+            for date, time_str, message, categories, recurrence in rows:
+                try:
+                    # A failed statement is undone on its own; the transaction and earlier rows stay
+                    conn.execute(
+                        'INSERT INTO reminders (date, time, message, categories, fire_at, recurrence) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (
+                            date, time_str, message, normalize_categories(categories),
+                            fire_timestamp(date, time_str), normalize_recurrence(recurrence),
+                        )
+                    )
+                except (sqlite3.IntegrityError, ValueError) as e:
+                    if on_error is None:
+                        raise
+                    on_error(e)
+                    continue
+                inserted += 1
+        return inserted
+
+    @timed(DB_QUERY_SECONDS)
+    def delete_reminder(self, reminder_id: int) -> None:
+        conn = self.connection()
+        with conn:
+            conn.execute('DELETE FROM reminders WHERE id = ?', (reminder_id,))
+
+    @timed(DB_QUERY_SECONDS)
+    def update_reminder_sent(self, reminder_id: int, sent_time: str) -> None:
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                'UPDATE reminders SET last_sent = ? WHERE id = ?',
+                (sent_time, reminder_id)
+            )
+
+    @timed(DB_QUERY_SECONDS)
+    def reschedule_reminder(self, reminder_id: int, next_occurrence: Tuple[str, int, int]) -> None:
+        """Move a recurring reminder to its (date, fire_at, occurrence number) without sending it"""
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                'UPDATE reminders SET date = ?, fire_at = ?, occurrences = ? WHERE id = ?',
+                (*next_occurrence, reminder_id)
+            )
+
+    @timed(DB_QUERY_SECONDS)
+    def enqueue_deliveries(
+        self,
+        reminder_id: int,
+        user_ids: Iterable[int],
+        sent_time: str,
+        next_occurrence: Optional[Tuple[str, int, int]] = None,
+        shards: int = 1,
+    ) -> int:
+        """Record one pending delivery per recipient and mark the reminder as sent, atomically
+
+        For a recurring reminder, next_occurrence is the (date, fire_at,
+        occurrence number) of the following occurrence, which replaces the current one in the same
+        transaction so a crash can neither lose nor repeat the series.
+        Recipients are spread over `shards` delivery shards by user id. Recipients in their quiet
+        hours are held back until the hours end; returns how many were.
+        """
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            preferences = self._quiet_hours_preferences()
+            deferred = 0
+            # Finished rows belong to the previous occurrence; unfinished ones are still being delivered
+            conn.execute("DELETE FROM deliveries WHERE reminder_id = ? AND status IN ('sent', 'failed')", (reminder_id,))
+
+            def rows():
+                nonlocal deferred
+                for user_id, deliver_after in delivery_times(user_ids, preferences, now):
+                    deferred += deliver_after > now
+                    yield reminder_id, user_id, user_id % shards, deliver_after
+
+            conn.executemany(
+                'INSERT OR IGNORE INTO deliveries (reminder_id, user_id, shard, deliver_after) VALUES (?, ?, ?, ?)',
+                rows()
+            )
+            conn.execute(
+                'UPDATE reminders SET last_sent = ? WHERE id = ?',
+                (sent_time, reminder_id)
+            )
+            if next_occurrence is not None:
+                conn.execute(
+                    'UPDATE reminders SET date = ?, fire_at = ?, occurrences = ? WHERE id = ?',
+                    (*next_occurrence, reminder_id)
+                )
+        return deferred
+
+    @timed(DB_QUERY_SECONDS)
+    def claim_deliveries(self, reminder_id: int, limit: int) -> List[int]:
+        """Move the next batch of pending deliveries that may be sent now to 'sending' and return their user ids"""
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute('''
+                UPDATE deliveries SET status = 'sending', updated_at = CURRENT_TIMESTAMP
+                WHERE rowid IN (
+                    SELECT rowid FROM deliveries
+                    WHERE status = 'pending' AND reminder_id = ? AND deliver_after <= ?
+                    LIMIT ?
+                )
+                RETURNING user_id
+            ''', (reminder_id, time.time(), limit))
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed(DB_QUERY_SECONDS)
+    def next_deferred_delivery(self, reminder_id: int) -> Optional[float]:
+        """When the earliest delivery of a reminder held back by quiet hours may be sent, if any is left"""
+        cursor = self.connection().execute(
+            "SELECT MIN(deliver_after) FROM deliveries WHERE reminder_id = ? AND status = 'pending'",
+            (reminder_id,)
+        )
+        return cursor.fetchone()[0]
+
+    @timed(DB_QUERY_SECONDS)
+    def claim_shard_deliveries(self, shard: int, limit: int) -> List[Tuple[int, int]]:
+        """Move the next batch of a shard's deliveries that may be sent now to 'sending'; returns (reminder_id, user_id) pairs"""
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute('''
+                UPDATE deliveries SET status = 'sending', updated_at = CURRENT_TIMESTAMP
+                WHERE rowid IN (
+                    SELECT rowid FROM deliveries
+                    WHERE shard = ? AND status = 'pending' AND deliver_after <= ?
+                    LIMIT ?
+                )
+                RETURNING reminder_id, user_id
+            ''', (shard, time.time(), limit))
+            return cursor.fetchall()
+
+    @timed(DB_QUERY_SECONDS)
+    def acquire_shards(self, worker_id: str, shards: int, ttl: float) -> Tuple[List[int], int]:
+        """Heartbeat, then rebalance this worker's shard leases; returns (shards held, live workers)
+
+        Every live worker aims for an equal share of the shards. Leases that
+        were not renewed within `ttl` seconds are free to take, and the
+        deliveries their dead owner left in 'sending' are requeued.
+        """
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            # Take the write lock up front so two workers cannot grab the same lease
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT OR IGNORE INTO shard_leases (shard) VALUES (?)', ((s,) for s in range(shards)))
+            conn.execute(
+                'INSERT OR REPLACE INTO delivery_workers (worker_id, heartbeat_at) VALUES (?, ?)',
+                (worker_id, now)
+            )
+            conn.execute('DELETE FROM delivery_workers WHERE heartbeat_at < ?', (now - ttl * 10,))
+            live = conn.execute(
+                'SELECT COUNT(*) FROM delivery_workers WHERE heartbeat_at >= ?', (now - ttl,)
+            ).fetchone()[0]
+            target = math.ceil(shards / max(live, 1))
+
+            held = [row[0] for row in conn.execute(
+                'SELECT shard FROM shard_leases WHERE owner = ? AND expires_at >= ? AND shard < ? ORDER BY shard',
+                (worker_id, now, shards)
+            )]
+            if len(held) > target:
+                # Another worker joined: hand back the surplus for it to pick up
+                conn.executemany(
+                    'UPDATE shard_leases SET owner = NULL, expires_at = 0 WHERE shard = ?',
+                    ((shard,) for shard in held[target:])
+                )
+                held = held[:target]
+            elif len(held) < target:
+                free = conn.execute('''
+                    SELECT shard, owner FROM shard_leases
+                    WHERE (owner IS NULL OR expires_at < ?) AND shard < ?
+                    ORDER BY shard LIMIT ?
+                ''', (now, shards, target - len(held))).fetchall()
+                for shard, previous_owner in free:
+                    if previous_owner is not None and previous_owner != worker_id:
+                        logger.warning("Taking over shard %s from unresponsive worker %s", shard, previous_owner)
+                    conn.execute(
+                        "UPDATE deliveries SET status = 'pending' WHERE shard = ? AND status = 'sending'",
+                        (shard,)
+                    )
+                    held.append(shard)
+
+            conn.executemany(
+                'UPDATE shard_leases SET owner = ?, expires_at = ? WHERE shard = ?',
+                ((worker_id, now + ttl, shard) for shard in held)
+            )
+            return sorted(held), live
+
+    @timed(DB_QUERY_SECONDS)
+    def renew_shard_leases(self, worker_id: str, ttl: float) -> None:
+        """Extend this worker's heartbeat and leases while it is busy delivering"""
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute('UPDATE delivery_workers SET heartbeat_at = ? WHERE worker_id = ?', (now, worker_id))
+            conn.execute(
+                'UPDATE shard_leases SET expires_at = ? WHERE owner = ? AND expires_at >= ?',
+                (now + ttl, worker_id, now)
+            )
+
+    @timed(DB_QUERY_SECONDS)
+    def release_shards(self, worker_id: str) -> None:
+        """Give up every lease on a clean shutdown so other workers take over at once"""
+        conn = self.connection()
+        with conn:
+            conn.execute('UPDATE shard_leases SET owner = NULL, expires_at = 0 WHERE owner = ?', (worker_id,))
+            conn.execute('DELETE FROM delivery_workers WHERE worker_id = ?', (worker_id,))
+
+    @timed(DB_QUERY_SECONDS)
+    def complete_deliveries(self, reminder_id: int, outcomes: List[Tuple[int, str, int, Optional[str]]]) -> None:
+        """Store the (user_id, status, attempts, error) results of a delivered batch and add them to today's totals"""
+        sent = sum(1 for _, status, _, _ in outcomes if status == 'sent')
+        retries = sum(max(attempts - 1, 0) for _, _, attempts, _ in outcomes)
+        conn = self.connection()
+        with conn:
+            conn.executemany('''
+                UPDATE deliveries
+                SET status = ?, attempts = attempts + ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE reminder_id = ? AND user_id = ?
+            ''', ((status, attempts, error, reminder_id, user_id) for user_id, status, attempts, error in outcomes))
+            conn.execute('''
+                INSERT INTO delivery_stats (day, sent, failed, retries) VALUES (?, ?, ?, ?)
+                ON CONFLICT (day) DO UPDATE SET
+                    sent = sent + excluded.sent, failed = failed + excluded.failed, retries = retries + excluded.retries
+            ''', (datetime.now(IST).strftime('%Y-%m-%d'), sent, len(outcomes) - sent, retries))
+
+    @timed(DB_QUERY_SECONDS)
+    def prune_unreachable_users(self) -> List[int]:
+        """Remove users whose last delivery failed permanently, unless they registered again since"""
+        placeholders = ','.join('?' * len(PERMANENT_SEND_ERRORS))
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(f'''
+                DELETE FROM users WHERE user_id IN (
+                    SELECT d.user_id FROM deliveries d JOIN users u ON u.user_id = d.user_id
+                    WHERE d.status = 'failed' AND d.error IN ({placeholders}) AND d.updated_at > u.updated_at
+                )
+                RETURNING user_id
+            ''', PERMANENT_SEND_ERRORS)
+            user_ids = [row[0] for row in cursor.fetchall()]
+        if self.subscribers is not None:
+            for user_id in user_ids:
+                self.subscribers.remove(user_id)
+        return user_ids
+
+    @timed(DB_QUERY_SECONDS)
+    def archive_reminders(self, before: float, limit: int) -> int:
+        """Move up to `limit` reminders that fired before `before` and have no unfinished deliveries to the archive
+
+        A recurring reminder is only archived once its series has no occurrences left after `before`.
+        """
+        conn = self.connection()
+        conn.create_function('has_occurrence_after', 5, _has_occurrence_after, deterministic=True)
+        with conn:
+            ids = [row[0] for row in conn.execute('''
+                SELECT id FROM reminders
+                WHERE fire_at < ? AND NOT has_occurrence_after(recurrence, date, time, occurrences, ?) AND NOT EXISTS (
+                    SELECT 1 FROM deliveries
+                    WHERE deliveries.reminder_id = reminders.id AND status IN ('pending', 'sending')
+                )
+                ORDER BY fire_at LIMIT ?
+            ''', (before, before, limit))]
+            if not ids:
+                return 0
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(f'''
+                INSERT OR REPLACE INTO reminders_archive
+                    (id, time, date, message, categories, last_sent, created_at, fire_at, recurrence, occurrences)
+                SELECT id, time, date, message, categories, last_sent, created_at, fire_at, recurrence, occurrences
+                FROM reminders WHERE id IN ({placeholders})
+            ''', ids)
+            conn.execute(f'DELETE FROM deliveries WHERE reminder_id IN ({placeholders})', ids)
+            conn.execute(f'DELETE FROM reminders WHERE id IN ({placeholders})', ids)
+            return len(ids)
+
+    @timed(DB_QUERY_SECONDS)
+    def optimize(self, vacuum_pages: int) -> None:
+        """Refresh query planner statistics and return up to `vacuum_pages` free pages to the file system"""
+        conn = self.connection()
+        conn.execute('PRAGMA optimize')
+        if self.incremental_vacuum_enabled():
+            # Each step frees one page, so the statement has to be stepped to completion
+            conn.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+        else:
+            logger.info(
+                "Incremental vacuum is off, so free pages are kept; enable it once with "
+                "`python maintenance.py --enable-incremental-vacuum` while the bot and web server are stopped"
+            )
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def incremental_vacuum_enabled(self) -> bool:
+        return self.connection().execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+    @timed(DB_QUERY_SECONDS)
+    def enable_incremental_vacuum(self) -> None:
+        """Switch to auto_vacuum=INCREMENTAL, which only takes effect after a full VACUUM
+
+        The VACUUM rebuilds the whole file under an exclusive lock, so on a
+        large database other processes would time out waiting for it: this
+        is a one-off step run by hand, never by the scheduled upkeep.
+        """
+        conn = self.connection()
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+
+    @timed(DB_QUERY_SECONDS)
+    def get_stats(self, days: int) -> Dict:
+        """Subscriber and reminder counts plus the last `days` days of delivery totals, without scanning any table"""
+        conn = self.connection()
+        counts = conn.execute('SELECT name, label, value FROM stats').fetchall()
+        history = conn.execute(
+            'SELECT day, sent, failed, retries FROM delivery_stats ORDER BY day DESC LIMIT ?', (days,)
+        ).fetchall()
+        return {
+            'user_stats': [
+                {'category': label or None, 'count': value}
+                for name, label, value in counts if name == 'users' and value
+            ],
+            'total_reminders': next((value for name, _, value in counts if name == 'reminders'), 0),
+            'deliveries': [
+                {
+                    'day': day, 'sent': sent, 'failed': failed, 'retries': retries,
+                    'failure_rate': round(failed / (sent + failed), 4) if sent + failed else 0.0,
+                }
+                for day, sent, failed, retries in reversed(history)
+            ],
+        }
+
+    @timed(DB_QUERY_SECONDS)
+    def count_unfinished_deliveries(self) -> int:
+        """Deliveries still waiting to be sent, the backlog a new broadcast queues behind"""
+        cursor = self.connection().execute("SELECT COUNT(*) FROM deliveries WHERE status IN ('pending', 'sending')")
+        return cursor.fetchone()[0]
+
+    @timed(DB_QUERY_SECONDS)
+    def requeue_unfinished_deliveries(self) -> List[int]:
+        """Return reminders with undelivered recipients, requeueing batches interrupted by a crash"""
+        conn = self.connection()
+        with conn:
+            conn.execute("UPDATE deliveries SET status = 'pending' WHERE status = 'sending'")
+            cursor = conn.execute("SELECT DISTINCT reminder_id FROM deliveries WHERE status = 'pending'")
+            return [row[0] for row in cursor.fetchall()]
+
+
+class AsyncDatabase:
+    """Runs Database methods on a dedicated thread so queries never block the event loop
+
+    Every method of the wrapped Database is exposed as a coroutine. Using a
+    single thread means the bot process has exactly one connection and its
+    writes are serialized without contending for SQLite's lock.
+    """
+
+    def __init__(self, database: Database):
+        # Imported here so the web server, which only uses Database, does not pay for asyncio at startup
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.sync = database
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+
+    async def run(self, func, *args, **kwargs):
+        """Call func(*args, **kwargs) on the database thread"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
+
+    def close(self) -> None:
+        self._executor.submit(self.sync.pool.close_all).result()
+        self._executor.shutdown()
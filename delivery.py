@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from metrics import DELIVERY_QUEUE_DEPTH, SEND_FAILURES_TOTAL, SEND_SECONDS, SENDS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows roughly 30 messages per second overall and 1 per second to the same chat
+DEFAULT_WORKERS = 16
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_PER_CHAT_RATE = 1.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self, seconds: float) -> None:
+        """Push the bucket into debt so nothing is sent for `seconds`"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+@dataclass
+class BroadcastResult:
+    """Outcome of one broadcast"""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+    errors: Dict[str, int] = field(default_factory=dict)
+    outcomes: List[Tuple[int, str, int, Optional[str]]] = field(default_factory=list)
+
+    def merge(self, other: 'BroadcastResult') -> None:
+        """Add the counts of a later batch of the same broadcast"""
+        self.total += other.total
+        self.sent += other.sent
+        self.failed += other.failed
+        self.retries += other.retries
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+        self.finished = other.finished
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Messages delivered per second"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class _Broadcast:
+    def __init__(self, payloads: Union[List[Dict], Dict[int, List[Dict]]]):
+        # One payload list for every chat, or a list per chat id for personalized reminders
+        self.payloads = payloads
+        self.result = BroadcastResult()
+        self.pending = 0
+        self.enqueued = False
+        self.done = asyncio.Event()
+
+    def finish_one(self) -> None:
+        self.pending -= 1
+        if self.enqueued and self.pending == 0:
+            self.result.finished = time.monotonic()
+            self.done.set()
+
+
+class DeliveryEngine:
+    """Bounded worker pool that fans reminders out to many chats
+
+    All broadcasts share one job queue and one global token bucket, so several
+    due reminders are delivered side by side without exceeding Telegram's
+    limits. Per-chat spacing (a bucket of capacity one) keeps consecutive
+    reminders to the same chat apart.
+    """
+
+    def __init__(
+        self,
+        bot,
+        workers: Optional[int] = None,
+        global_rate: Optional[float] = None,
+        per_chat_rate: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ):
+        self.bot = bot
+        # Settings not passed explicitly come from the environment (config/.env)
+        self.workers = workers or int(os.getenv('DELIVERY_WORKERS', DEFAULT_WORKERS))
+        self.per_chat_rate = per_chat_rate or float(os.getenv('PER_CHAT_RATE_LIMIT', DEFAULT_PER_CHAT_RATE))
+        self.max_attempts = max_attempts or int(os.getenv('MAX_SEND_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        self.global_bucket = TokenBucket(global_rate or float(os.getenv('GLOBAL_RATE_LIMIT', DEFAULT_GLOBAL_RATE)))
+        self._chat_last_sent: Dict[int, float] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+        self._tasks: List[asyncio.Task] = []
+        DELIVERY_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def broadcast(
+        self, chat_ids: Iterable[int], payloads: Union[List[Dict], Dict[int, List[Dict]]]
+    ) -> BroadcastResult:
+        """Send the pre-rendered sendMessage payloads (shared, or per chat id) to every chat and wait for all sends"""
+        self.start()
+        broadcast = _Broadcast(payloads)
+        for chat_id in chat_ids:
+            broadcast.pending += 1
+            broadcast.result.total += 1
+            await self._queue.put((broadcast, chat_id))
+        broadcast.enqueued = True
+        if broadcast.pending == 0:
+            broadcast.result.finished = time.monotonic()
+            broadcast.done.set()
+        await broadcast.done.wait()
+        return broadcast.result
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        interval = 1.0 / self.per_chat_rate
+        now = time.monotonic()
+        last_sent = self._chat_last_sent.get(chat_id)
+        if last_sent is not None and now - last_sent < interval:
+            await asyncio.sleep(interval - (now - last_sent))
+        self._chat_last_sent[chat_id] = time.monotonic()
+        # Forget chats that have been idle long enough not to matter
+        if len(self._chat_last_sent) > 10000:
+            cutoff = time.monotonic() - interval
+            self._chat_last_sent = {k: v for k, v in self._chat_last_sent.items() if v >= cutoff}
+
+    async def _worker(self) -> None:
+        while True:
+            broadcast, chat_id = await self._queue.get()
+            try:
+                await self._deliver(broadcast, chat_id)
+            except Exception as e:
+                logger.error("Unexpected delivery error for %s: %s", chat_id, e, exc_info=True)
+            finally:
+                broadcast.finish_one()
+                self._queue.task_done()
+
+    async def _deliver(self, broadcast: _Broadcast, chat_id: int) -> None:
+        result = broadcast.result
+        error = None
+        # Index of the next payload, so a retry does not repeat parts already delivered
+        part = 0
+        payloads = broadcast.payloads if isinstance(broadcast.payloads, list) else broadcast.payloads[chat_id]
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                while part < len(payloads):
+                    await self._wait_for_chat(chat_id)
+                    await self.global_bucket.acquire()
+                    with SEND_SECONDS.time():
+                        await self.bot.send_message(chat_id=chat_id, **payloads[part])
+                    part += 1
+                result.sent += 1
+                SENDS_TOTAL.inc(result='sent')
+                result.outcomes.append((chat_id, 'sent', attempt, None))
+                return
+            except RetryAfter as e:
+                # Flood control applies to the whole bot, so pause every worker
+                logger.warning("Flood control hit, retrying in %ss", e.retry_after)
+                self.global_bucket.drain(float(e.retry_after))
+                error = type(e).__name__
+                SEND_FAILURES_TOTAL.inc(error=error)
+            except (Forbidden, BadRequest) as e:
+                # Blocked bot, deleted chat or malformed message: retrying will not help
+                error = type(e).__name__
+                SEND_FAILURES_TOTAL.inc(error=error)
+                break
+            except TelegramError as e:
+                # Timeouts and network errors are usually transient
+                error = type(e).__name__
+                SEND_FAILURES_TOTAL.inc(error=error)
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+            if attempt < self.max_attempts:
+                result.retries += 1
+
+        result.failed += 1
+        result.errors[error] = result.errors.get(error, 0) + 1
+        SENDS_TOTAL.inc(result='failed')
+        result.outcomes.append((chat_id, 'failed', attempt, error))
+        logger.debug("Failed to send reminder to %s: %s", chat_id, error)
@@ -0,0 +1,153 @@
+"""Delivery worker process for sharded broadcasting
+
+With DELIVERY_SHARDS set, bot.py only writes each broadcast's recipients to
+the deliveries outbox, spread over that many shards by user id. Start one
+or more workers next to it:
+
+    python delivery_worker.py
+
+Each worker leases an equal share of the shards and sends their pending
+deliveries with its own event loop and HTTP connection pool. Leases are
+renewed by a heartbeat; when a worker dies its leases expire and the
+remaining workers take its shards over.
+"""
+from startup import StartupProfile  # isort: skip - must be the first import, see startup.py
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+from telegram import Bot
+
+from database import AsyncDatabase, Database
+from delivery import DEFAULT_GLOBAL_RATE, DeliveryEngine
+from http_client import broadcast_bot
+from logging_config import configure_logging
+from messages import PayloadCache
+
+load_dotenv('config/.env')
+TOKEN = os.getenv('TELEGRAM_TOKEN')
+if not TOKEN:
+    raise ValueError("No token found in environment variables")
+
+configure_logging()
+logger = logging.getLogger(__name__)
+startup_profile = StartupProfile()
+
+# Must match the bot's setting; recipients are assigned to shard user_id % DELIVERY_SHARDS
+DELIVERY_SHARDS = int(os.getenv('DELIVERY_SHARDS', '0'))
+# A worker that has not renewed its leases for this many seconds is considered dead
+SHARD_LEASE_TTL = float(os.getenv('SHARD_LEASE_TTL', '30'))
+# Pause between outbox polls when there is nothing to send
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '0.5'))
+DELIVERY_BATCH_SIZE = int(os.getenv('DELIVERY_BATCH_SIZE', '500'))
+# Telegram's limit applies to the bot as a whole, so it is split between live workers
+GLOBAL_RATE_LIMIT = float(os.getenv('GLOBAL_RATE_LIMIT', DEFAULT_GLOBAL_RATE))
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL')
+
+
+class DeliveryWorker:
+    """Leases delivery shards and drains their pending outbox rows"""
+
+    def __init__(self, bot: Bot, db: AsyncDatabase, shards: int = DELIVERY_SHARDS):
+        self.bot = bot
+        self.db = db
+        self.shards = shards
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.engine = DeliveryEngine(bot)
+        self.payload_cache = PayloadCache()
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def heartbeat(self) -> None:
+        """Keep leases alive while a long batch is being sent"""
+        while not self._stopping.is_set():
+            await asyncio.sleep(SHARD_LEASE_TTL / 3)
+            try:
+                await self.db.renew_shard_leases(self.worker_id, SHARD_LEASE_TTL)
+            except Exception as e:
+                logger.error("Failed to renew shard leases: %s", e)
+
+    async def deliver_batch(self, shard: int, batch: List[Tuple[int, int]]) -> None:
+        """Send one claimed batch, which may span several reminders, and store the outcomes"""
+        recipients: Dict[int, List[int]] = defaultdict(list)
+        for reminder_id, user_id in batch:
+            recipients[reminder_id].append(user_id)
+
+        for reminder_id, user_ids in recipients.items():
+            reminder = await self.db.get_reminder(reminder_id)
+            if not reminder:
+                # Deleted while queued: record the rows as failed so they are not claimed again
+                await self.db.complete_deliveries(reminder_id, [(u, 'failed', 0, 'Deleted') for u in user_ids])
+                continue
+            message = self.payload_cache.get(reminder)
+            profiles = await self.db.get_user_profiles(user_ids) if message.personalized else {}
+            result = await self.engine.broadcast(user_ids, message.render(user_ids, profiles, time.time()))
+            await self.db.complete_deliveries(reminder_id, result.outcomes)
+            logger.info(
+                "Shard %s: reminder %s delivered to %d/%d users in %.1fs (%.1f msg/s)",
+                shard, reminder_id, result.sent, result.total, result.elapsed, result.throughput,
+                extra={'reminder_id': reminder_id, 'shard': shard, 'sent': result.sent, 'failed': result.failed}
+            )
+
+    async def run(self) -> None:
+        logger.info("Delivery worker %s started for %s shards", self.worker_id, self.shards)
+        heartbeat = asyncio.create_task(self.heartbeat())
+        held: List[int] = []
+        try:
+            while not self._stopping.is_set():
+                shards, live = await self.db.acquire_shards(self.worker_id, self.shards, SHARD_LEASE_TTL)
+                if shards != held:
+                    logger.info("Holding shards %s (%s live workers)", shards or 'none', live)
+                    held = shards
+                self.engine.global_bucket.rate = GLOBAL_RATE_LIMIT / max(live, 1)
+
+                busy = False
+                for shard in shards:
+                    batch = await self.db.claim_shard_deliveries(shard, DELIVERY_BATCH_SIZE)
+                    if batch:
+                        busy = True
+                        await self.deliver_batch(shard, batch)
+                if not busy:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), WORKER_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            heartbeat.cancel()
+            await self.engine.stop()
+            await self.db.release_shards(self.worker_id)
+            logger.info("Delivery worker %s stopped", self.worker_id)
+
+
+async def main() -> None:
+    if DELIVERY_SHARDS < 1:
+        raise ValueError("Set DELIVERY_SHARDS in config/.env to run delivery workers")
+
+    startup_profile.mark('imports')
+    # Each worker has its own BROADCAST_POOL_SIZE connections, so throughput scales with the number of workers
+    bot = broadcast_bot(TOKEN, f"{TELEGRAM_BASE_URL.rstrip('/')}/bot" if TELEGRAM_BASE_URL else None)
+    db = AsyncDatabase(Database())
+    startup_profile.mark('database')
+    worker = DeliveryWorker(bot, db)
+    startup_profile.report('Delivery worker')
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    async with bot:
+        await worker.run()
+    db.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
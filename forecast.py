@@ -0,0 +1,210 @@
+"""Dry-run forecast of upcoming broadcasts
+
+Works out, without sending anything, when each reminder firing in the next
+few days will start and finish sending, given its recipient count and
+Telegram's global rate limit. Every broadcast shares that one limit, so
+broadcasts are modelled as a single FIFO queue drained at GLOBAL_RATE_LIMIT
+messages per second, starting behind any deliveries still in the outbox.
+Recipients in quiet hours are counted as if sent at fire time, so the
+forecast errs on the busy side.
+
+From the command line:
+
+    python forecast.py --days 7
+    python forecast.py --date 25/12/2026 --time 18:00 --categories all
+
+The second form adds a reminder that has not been saved yet, to see how it
+would fit. The admin API serves the same report at /api/forecast.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from database import IST, Database, fire_timestamp, normalize_categories
+from messages import render_reminder
+from recurrence import DATE_FORMAT, RecurrenceRule, normalize_recurrence
+
+DEFAULT_FORECAST_DAYS = 7
+MAX_FORECAST_DAYS = 31
+
+# Broadcasts whose last message would go out more than this many seconds after the fire time are flagged
+DEFAULT_MAX_DELAY = 3600.0
+
+
+def default_rate() -> float:
+    """GLOBAL_RATE_LIMIT as the delivery engine reads it"""
+    # Imported here because delivery loads python-telegram-bot, which the web server otherwise never needs
+    from delivery import DEFAULT_GLOBAL_RATE
+
+    return float(os.getenv('GLOBAL_RATE_LIMIT', DEFAULT_GLOBAL_RATE))
+
+
+def candidate_reminder(
+    date: str, time_str: str, categories: str, message: str = '', recurrence: Optional[str] = None
+) -> Dict:
+    """An unsaved reminder to include in a forecast; raises ValueError if it could not be saved either"""
+    return {
+        'id': None, 'date': date, 'time': time_str, 'message': message or ' ',
+        'categories': normalize_categories(categories), 'fire_at': fire_timestamp(date, time_str),
+        'recurrence': normalize_recurrence(recurrence), 'occurrences': 1,
+    }
+
+
+def occurrences(reminder: Dict, until: float) -> Iterator[Tuple[str, int]]:
+    """(date, fire_at) of each occurrence of a reminder that fires before `until`"""
+    rule = RecurrenceRule.parse(reminder['recurrence']) if reminder.get('recurrence') else None
+    date, fire_at, occurrence = reminder['date'], reminder['fire_at'], reminder['occurrences']
+    while fire_at < until:
+        yield date, fire_at
+        if rule is None:
+            return
+        following = rule.next_date(datetime.strptime(date, DATE_FORMAT).date(), occurrence)
+        if following is None:
+            return
+        occurrence += 1
+        date = following.strftime(DATE_FORMAT)
+        fire_at = fire_timestamp(date, reminder['time'])
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, IST).isoformat(timespec='seconds')
+
+
+def forecast(
+    database: Database,
+    days: int = DEFAULT_FORECAST_DAYS,
+    rate: Optional[float] = None,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    candidate: Optional[Dict] = None,
+    now: Optional[float] = None,
+) -> Dict:
+    """Forecast every broadcast in the next `days` days, with overlap and saturation warnings"""
+    rate = rate or default_rate()
+    now = time.time() if now is None else now
+    until = now + days * 86400
+
+    reminders = database.get_upcoming_reminders(now, until)
+    if candidate is not None:
+        reminders.append(candidate)
+
+    # Recipients are resolved once per distinct category list; a reminder's length decides how many
+    # messages each recipient gets
+    recipients: Dict[str, int] = {}
+    broadcasts = []
+    for reminder in reminders:
+        categories = reminder['categories']
+        if categories not in recipients:
+            recipients[categories] = len(database.get_users_by_categories(categories.split(',')))
+        parts = len(render_reminder(reminder['message']))
+        for date, fire_at in occurrences(reminder, until):
+            if fire_at >= now:
+                broadcasts.append((fire_at, reminder, date, recipients[categories], parts))
+    # The candidate goes last among reminders firing at the same second, as it would be created last
+    broadcasts.sort(key=lambda b: (b[0], b[1]['id'] is None, b[1]['id'] or 0))
+
+    backlog = database.count_unfinished_deliveries()
+    free_at = now + backlog / rate
+    report: List[Dict] = []
+    warnings: List[Dict] = []
+    previous: Optional[Dict] = None
+    for fire_at, reminder, date, count, parts in broadcasts:
+        start = max(fire_at, free_at)
+        finish = start + count * parts / rate
+        entry = {
+            'reminder_id': reminder['id'],
+            'candidate': reminder['id'] is None,
+            'date': date,
+            'time': reminder['time'],
+            'categories': reminder['categories'],
+            'recipients': count,
+            'messages': count * parts,
+            'fire_at': _isoformat(fire_at),
+            'start': _isoformat(start),
+            'finish': _isoformat(finish),
+            'wait_seconds': round(start - fire_at, 1),
+            'duration_seconds': round(finish - start, 1),
+        }
+        if start > fire_at:
+            if previous is None:
+                blocker = 'the outbox backlog'
+            elif previous['candidate']:
+                blocker = 'the new reminder'
+            else:
+                blocker = f"reminder {previous['reminder_id']}"
+            warnings.append({
+                'type': 'overlap', 'reminder_id': reminder['id'], 'date': date,
+                'message': f"Starts {start - fire_at:.0f}s late, queued behind {blocker}",
+            })
+        if finish - fire_at > max_delay:
+            warnings.append({
+                'type': 'saturation', 'reminder_id': reminder['id'], 'date': date,
+                'message': (
+                    f"Last of {count * parts} messages goes out {(finish - fire_at) / 60:.0f} minutes after "
+                    f"the fire time at {rate:g} msg/s"
+                ),
+            })
+        report.append(entry)
+        previous = entry
+        free_at = finish
+
+    return {
+        'generated_at': _isoformat(now),
+        'days': days,
+        'rate_limit': rate,
+        'outbox_backlog': backlog,
+        'broadcasts': report,
+        'total_messages': sum(entry['messages'] for entry in report),
+        'warnings': warnings,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=DEFAULT_FORECAST_DAYS, help='how far ahead to forecast')
+    parser.add_argument('--rate', type=float, help='global send rate limit (default: GLOBAL_RATE_LIMIT)')
+    parser.add_argument('--max-delay', type=float, default=DEFAULT_MAX_DELAY,
+                        help='flag broadcasts finishing more than this many seconds after their fire time')
+    parser.add_argument('--date', help='date of a reminder to try out, DD/MM/YYYY')
+    parser.add_argument('--time', help='time of that reminder, HH:MM (IST)')
+    parser.add_argument('--categories', default='all', help='categories of that reminder')
+    parser.add_argument('--message', default='', help='message of that reminder, for its length')
+    parser.add_argument('--recurrence', help='recurrence rule of that reminder')
+    parser.add_argument('--database', default='data/reminders.db', help='database file')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+    load_dotenv('config/.env')
+
+    candidate = None
+    if args.date or args.time:
+        if not (args.date and args.time):
+            parser.error('--date and --time go together')
+        try:
+            candidate = candidate_reminder(args.date, args.time, args.categories, args.message, args.recurrence)
+        except ValueError as e:
+            parser.error(str(e))
+
+    result = forecast(
+        Database(args.database), min(max(args.days, 1), MAX_FORECAST_DAYS), args.rate, args.max_delay, candidate
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"{len(result['broadcasts'])} broadcasts, {result['total_messages']} messages "
+          f"in the next {result['days']} days at {result['rate_limit']:g} msg/s")
+    for entry in result['broadcasts']:
+        name = 'new reminder' if entry['candidate'] else f"reminder {entry['reminder_id']}"
+        print(f"  {entry['fire_at']}  {name:<14} {entry['recipients']:>8} recipients  "
+              f"start +{entry['wait_seconds']:.0f}s  takes {entry['duration_seconds']:.0f}s")
+    for warning in result['warnings']:
+        print(f"WARNING {warning['type']}: reminder {warning['reminder_id'] or '(new)'} on {warning['date']}: "
+              f"{warning['message']}")
+
+
+if __name__ == '__main__':
+    main()
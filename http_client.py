@@ -0,0 +1,60 @@
+import logging
+import os
+from typing import Optional
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from delivery import DEFAULT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open to the Bot API for each kind of traffic
+DEFAULT_UPDATES_POOL_SIZE = 1
+DEFAULT_COMMAND_POOL_SIZE = 16
+
+
+def _float_setting(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def make_request(pool_size: int) -> HTTPXRequest:
+    """HTTPX request object with its own keep-alive connection pool, configured from the environment
+
+    TELEGRAM_HTTP_VERSION=2 multiplexes requests over fewer connections and
+    needs the http2 extra of python-telegram-bot. Timeouts come from
+    TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT, TELEGRAM_WRITE_TIMEOUT and
+    TELEGRAM_POOL_TIMEOUT (seconds).
+    """
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        http_version=os.getenv('TELEGRAM_HTTP_VERSION', '1.1'),
+        connect_timeout=_float_setting('TELEGRAM_CONNECT_TIMEOUT', 5.0),
+        # getUpdates adds its long-polling timeout on top of this
+        read_timeout=_float_setting('TELEGRAM_READ_TIMEOUT', 5.0),
+        write_timeout=_float_setting('TELEGRAM_WRITE_TIMEOUT', 5.0),
+        # How long a request may wait for a free connection before failing with a retryable TimedOut
+        pool_timeout=_float_setting('TELEGRAM_POOL_TIMEOUT', 10.0),
+    )
+
+
+def updates_request() -> HTTPXRequest:
+    """Dedicated pool for getUpdates, so long polling never occupies a connection replies need"""
+    return make_request(int(os.getenv('UPDATES_POOL_SIZE', DEFAULT_UPDATES_POOL_SIZE)))
+
+
+def command_request() -> HTTPXRequest:
+    """Pool for command replies; broadcasts never use it, so replies are not stuck behind a large fan-out"""
+    return make_request(int(os.getenv('COMMAND_POOL_SIZE', DEFAULT_COMMAND_POOL_SIZE)))
+
+
+def broadcast_bot(token: str, base_url: Optional[str] = None, pool_size: Optional[int] = None) -> Bot:
+    """Bot instance with its own connection pool for reminder broadcasts"""
+    # One connection per delivery worker by default: a larger pool is never used, and a smaller one
+    # makes sends wait for connections
+    pool_size = pool_size or int(os.getenv('BROADCAST_POOL_SIZE') or os.getenv('DELIVERY_WORKERS', DEFAULT_WORKERS))
+    options = {'request': make_request(pool_size)}
+    if base_url:
+        options['base_url'] = base_url
+    logger.info("Broadcast connection pool size: %s", pool_size)
+    return Bot(token, **options)
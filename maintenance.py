@@ -0,0 +1,89 @@
+"""Database upkeep run by the bot, plus one-off steps to run by hand
+
+The bot prunes and archives every MAINTENANCE_INTERVAL seconds and
+optimizes at MAINTENANCE_HOUR. Switching an existing database to
+incremental vacuum needs a full VACUUM, which locks out every other
+process for as long as it takes, so it is only done from the command line:
+
+    python maintenance.py --enable-incremental-vacuum
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import time as day_time
+from zoneinfo import ZoneInfo
+
+from database import AsyncDatabase, Database
+from logging_config import configure_logging
+from scheduler import CATCH_UP_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# How often unreachable users are pruned and fired reminders archived
+DEFAULT_MAINTENANCE_INTERVAL = 900
+# Reminders are archived this many days after they last fired (never before the scheduler's catch-up window)
+DEFAULT_ARCHIVE_AFTER_DAYS = 7
+# Reminders moved per transaction, so the bot and web server are never locked out for long
+ARCHIVE_BATCH_SIZE = 1000
+# Reminder change log entries are kept this long; the bot applies them within seconds
+CHANGE_LOG_RETENTION = 86400
+# Free pages released by one incremental vacuum
+VACUUM_PAGES = 10000
+
+
+def quiet_time(tz) -> day_time:
+    """Time of day for the heavier database upkeep, MAINTENANCE_HOUR (default 4 AM) in the given pytz zone"""
+    # A pytz zone set directly as tzinfo uses its oldest offset (LMT, +05:53 for IST); zoneinfo resolves the current one
+    return day_time(hour=int(os.getenv('MAINTENANCE_HOUR', '4')), tzinfo=ZoneInfo(tz.zone))
+
+
+async def prune_and_archive(db: AsyncDatabase) -> None:
+    """Drop users who blocked the bot, move reminders that have fired out of the hot table and trim the change log"""
+    pruned = await db.prune_unreachable_users()
+    if pruned:
+        logger.info("Removed %d users who blocked the bot or deleted their account", len(pruned))
+
+    archive_after = float(os.getenv('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)) * 86400
+    before = time.time() - max(archive_after, CATCH_UP_WINDOW)
+    archived = 0
+    while True:
+        moved = await db.archive_reminders(before, ARCHIVE_BATCH_SIZE)
+        archived += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+    if archived:
+        logger.info("Archived %d reminders that have fired", archived)
+
+    await db.trim_reminder_changes(CHANGE_LOG_RETENTION)
+
+
+async def optimize_database(db: AsyncDatabase) -> None:
+    """ANALYZE where useful and give free pages back; meant for quiet hours"""
+    started = time.perf_counter()
+    await db.optimize(VACUUM_PAGES)
+    logger.info("Database optimized in %.1fs", time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='run the one-off full VACUUM that enables incremental vacuum')
+    parser.add_argument('--database', default='data/reminders.db', help='database file')
+    args = parser.parse_args()
+    if not args.enable_incremental_vacuum:
+        parser.error('nothing to do')
+
+    configure_logging()
+    database = Database(args.database)
+    if database.incremental_vacuum_enabled():
+        logger.info("Incremental vacuum is already enabled")
+        return
+    logger.info("Running a full VACUUM to enable incremental vacuum; other processes are locked out until it ends")
+    started = time.perf_counter()
+    database.enable_incremental_vacuum()
+    logger.info("Incremental vacuum enabled in %.1fs", time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
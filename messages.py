@@ -0,0 +1,264 @@
+import logging
+from collections import OrderedDict
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from database import fire_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this many characters
+TELEGRAM_MAX_LENGTH = 4096
+
+# Number of rendered reminders kept in memory
+PAYLOAD_CACHE_SIZE = 256
+
+REMINDER_HEADER = "⏰ *Reminder!*\n\n"
+REMINDER_FOOTER = "\n\n_To stop receiving reminders, use /stop_"
+
+# Placeholders a reminder message may contain; {countdown:DD/MM/YYYY HH:MM} counts down to an IST deadline
+TEMPLATE_FIELDS = ('username', 'category', 'countdown')
+# Longest text each placeholder renders to (Telegram usernames have at most 32 characters)
+_MAX_FIELD_LENGTH = {'username': 32, 'category': 10, 'countdown': 40}
+# What {username} renders to for users without a Telegram username
+MISSING_USERNAME = 'there'
+
+# (user_id) -> (username, category), as stored on the users table
+Profiles = Dict[int, Tuple[Optional[str], Optional[str]]]
+
+# Characters with meaning in Telegram's legacy Markdown
+_MARKDOWN_ENTITIES = '*_`['
+
+
+def escape_markdown(text: str) -> str:
+    """Escape legacy Markdown so the text is sent exactly as written"""
+    for char in _MARKDOWN_ENTITIES:
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+def is_valid_markdown(text: str) -> bool:
+    """Check that every legacy Markdown entity is closed, as Telegram's parser requires"""
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            close = text.find('](', i + 1)
+            end = text.find(')', close + 2) if close != -1 else -1
+            if end == -1:
+                return False
+            i = end + 1
+            continue
+        if text.startswith('```', i):
+            end = text.find('```', i + 3)
+            if end == -1:
+                return False
+            i = end + 3
+            continue
+        if char in '*_`':
+            # Entities do not nest in legacy Markdown, so the next marker must close this one
+            end = text.find(char, i + 1)
+            if end == -1:
+                return False
+            i = end + 1
+            continue
+        i += 1
+    return True
+
+
+def split_text(text: str, limit: int) -> List[str]:
+    """Split text into chunks of at most `limit` characters, preferring line breaks"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = text.rfind(' ', 0, limit)
+        if cut <= 0:
+            cut = limit
+        if text[cut - 1] == '\\':
+            # Keep an escape together with the character it escapes
+            cut -= 1
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    chunks.append(text)
+    return chunks
+
+
+def render_reminder(message: str) -> List[Dict]:
+    """Build the sendMessage payloads for a reminder body
+
+    Bodies with broken Markdown are escaped rather than rejected by
+    Telegram, and bodies over the length limit are split into several
+    messages with the header on the first and the footer on the last.
+    """
+    body = message if is_valid_markdown(message) else escape_markdown(message)
+    limit = TELEGRAM_MAX_LENGTH - len(REMINDER_HEADER) - len(REMINDER_FOOTER)
+    chunks = split_text(body, limit)
+    if not all(is_valid_markdown(chunk) for chunk in chunks):
+        # The split separated an entity's markers, so send the body as plain text instead
+        chunks = split_text(escape_markdown(message), limit)
+    chunks[0] = REMINDER_HEADER + chunks[0]
+    chunks[-1] = chunks[-1] + REMINDER_FOOTER
+    return [{'text': chunk, 'parse_mode': 'Markdown'} for chunk in chunks]
+
+
+def parse_template(message: str) -> List[Tuple[str, Optional[str], Optional[int]]]:
+    """Split a message into (literal text, placeholder, countdown deadline) parts
+
+    Raises ValueError for unbalanced braces, unknown placeholders and
+    malformed countdown deadlines. Literal braces are written {{ and }}.
+    """
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(message):
+        if field is None:
+            parts.append((literal, None, None))
+            continue
+        if field not in TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown placeholder {{{field}}}, use one of {', '.join(TEMPLATE_FIELDS)}")
+        if conversion:
+            raise ValueError(f"Placeholder {{{field}}} does not take a conversion")
+        deadline = None
+        if field == 'countdown':
+            date, _, time_str = (spec or '').strip().partition(' ')
+            try:
+                deadline = fire_timestamp(date, time_str.strip())
+            except ValueError:
+                raise ValueError("Write countdowns as {countdown:DD/MM/YYYY HH:MM}")
+        elif spec:
+            raise ValueError(f"Placeholder {{{field}}} does not take a format")
+        parts.append((literal, field, deadline))
+    return parts
+
+
+def format_countdown(seconds: float) -> str:
+    """Time left as its two largest units, e.g. '2 days 5 hours'"""
+    minutes = max(int(seconds // 60), 0)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    units = [
+        f"{n} {unit}{'s' if n != 1 else ''}"
+        for n, unit in ((days, 'day'), (hours, 'hour'), (minutes, 'minute')) if n
+    ]
+    return ' '.join(units[:2]) if units else 'less than a minute'
+
+
+def _format_literal(text: str) -> str:
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+class CompiledMessage:
+    """A reminder message prepared once for sending to any number of recipients
+
+    Messages without placeholders are rendered to one list of payloads that
+    every recipient shares. For templates, the Markdown checks, escaping and
+    header/footer are applied to the literal text at compile time, leaving a
+    format string in which rendering a recipient only fills in the
+    placeholders. Recipients who would get the same text (for example with
+    only {category} in the template) share one payload list, and countdowns
+    are worked out once per batch.
+    """
+
+    def __init__(self, message: str):
+        try:
+            parts = parse_template(message)
+        except ValueError:
+            # Saved before templates were validated: send the text as written
+            parts = [(message, None, None)]
+
+        self.fields = {field for _, field, _ in parts if field}
+        self.deadlines: Dict[str, int] = {}
+        if not self.fields:
+            self.payloads: Optional[List[Dict]] = render_reminder(''.join(literal for literal, _, _ in parts))
+            return
+        self.payloads = None
+
+        names = []
+        for literal, field, deadline in parts:
+            if field == 'countdown':
+                field = f'countdown_{len(self.deadlines)}'
+                self.deadlines[field] = deadline
+            names.append(field)
+
+        # Literal Markdown stays as written only if it is valid whatever the placeholders render to
+        sample = ''.join(literal + ('x' if field else '') for literal, field, _ in parts)
+        markdown = is_valid_markdown(sample)
+        def format_string(escape) -> str:
+            return ''.join(
+                _format_literal(escape(literal)) + (f'{{{name}}}' if name else '')
+                for (literal, _, _), name in zip(parts, names)
+            )
+
+        longest = len(sample) + sum(_MAX_FIELD_LENGTH[field] for _, field, _ in parts if field)
+        self._split = longest > TELEGRAM_MAX_LENGTH - len(REMINDER_HEADER) - len(REMINDER_FOOTER)
+        if self._split:
+            # Where to split depends on the rendered length, so the raw text is rendered per recipient
+            self._format = format_string(str)
+        else:
+            body = format_string(str if markdown else escape_markdown)
+            self._format = _format_literal(REMINDER_HEADER) + body + _format_literal(REMINDER_FOOTER)
+
+    @property
+    def personalized(self) -> bool:
+        """Whether payloads differ between recipients, so profiles have to be loaded to render them"""
+        return bool(self.fields & {'username', 'category'})
+
+    def render(self, user_ids: Iterable[int], profiles: Profiles, now: float) -> Union[List[Dict], Dict[int, List[Dict]]]:
+        """Payloads shared by every recipient, or a payload list per user id for personalized templates"""
+        if self.payloads is not None:
+            return self.payloads
+        values = {name: format_countdown(deadline - now) for name, deadline in self.deadlines.items()}
+        if not self.personalized:
+            return self._render(values)
+
+        uses_username, uses_category = 'username' in self.fields, 'category' in self.fields
+        rendered: Dict[Tuple, List[Dict]] = {}
+        by_user: Dict[int, List[Dict]] = {}
+        for user_id in user_ids:
+            username, category = profiles.get(user_id, (None, None))
+            key = (username if uses_username else None, category if uses_category else None)
+            payloads = rendered.get(key)
+            if payloads is None:
+                values['username'] = username or MISSING_USERNAME
+                values['category'] = (category or '').upper()
+                payloads = rendered[key] = self._render(values)
+            by_user[user_id] = payloads
+        return by_user
+
+    def _render(self, values: Dict[str, str]) -> List[Dict]:
+        if self._split:
+            return render_reminder(self._format.format_map(values))
+        if 'username' in values:
+            values = {**values, 'username': escape_markdown(values['username'])}
+        return [{'text': self._format.format_map(values), 'parse_mode': 'Markdown'}]
+
+
+class PayloadCache:
+    """LRU cache of compiled reminder messages keyed by (reminder id, version)
+
+    A reminder is compiled once and the same payload objects or renderer are
+    reused for every recipient and every resumed batch; editing a reminder
+    bumps its version, which makes the old entry unreachable.
+    """
+
+    def __init__(self, max_size: int = PAYLOAD_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple[int, int], CompiledMessage]' = OrderedDict()
+
+    def get(self, reminder: Dict) -> CompiledMessage:
+        key = (reminder['id'], reminder.get('version') or 1)
+        compiled: Optional[CompiledMessage] = self._entries.get(key)
+        if compiled is not None:
+            self._entries.move_to_end(key)
+            return compiled
+
+        compiled = CompiledMessage(reminder['message'])
+        if compiled.payloads is not None and len(compiled.payloads) > 1:
+            logger.info("Reminder %s is split into %s messages", reminder['id'], len(compiled.payloads))
+        self._entries[key] = compiled
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return compiled
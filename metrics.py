@@ -0,0 +1,225 @@
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond queries to multi-second sends
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count, optionally split by labels"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{_format_labels(key)} {value}' for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Value that goes up and down; may be computed on scrape with set_function"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels) -> None:
+        with self._lock:
+            self._functions[_label_key(labels)] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.debug("Gauge %s callback failed: %s", self.name, e)
+        return [f'{self.name}{_format_labels(key)} {value}' for key, value in values.items()]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, **labels) -> 'Timer':
+        return Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(key, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {counts[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+
+class Timer:
+    """Context manager that records its elapsed time in a histogram"""
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, object]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator timing a sync or async function; the function name is added as a label if none is given"""
+    def decorator(func):
+        label_values = labels or {'method': func.__name__}
+
+        # inspect rather than asyncio, which the web server never needs to import
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**label_values):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**label_values):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+REGISTRY: List[Metric] = []
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Scrapes every few seconds would drown out the bot's own logs
+        pass
+
+
+def start_http_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    logger.info("Metrics available at http://%s:%s/metrics", host, port)
+    return server
+
+
+# Shared metrics for the bot and the admin server
+DB_QUERY_SECONDS = Histogram('gmt_db_query_seconds', 'Latency of Database methods')
+HANDLER_SECONDS = Histogram('gmt_handler_seconds', 'Latency of bot command handlers')
+BROADCAST_TICK_SECONDS = Histogram('gmt_broadcast_tick_seconds', 'Duration of one broadcast loop iteration')
+SEND_SECONDS = Histogram('gmt_send_seconds', 'Latency of a single sendMessage call')
+SENDS_TOTAL = Counter('gmt_sends_total', 'Reminder deliveries by result')
+SEND_FAILURES_TOTAL = Counter('gmt_send_failures_total', 'Failed sendMessage calls by error type')
+DELIVERY_QUEUE_DEPTH = Gauge('gmt_delivery_queue_depth', 'Sends waiting in the delivery engine queue')
+UPDATE_QUEUE_DEPTH = Gauge('gmt_update_queue_depth', 'Telegram updates waiting to be processed')
+SCHEDULER_LAG_SECONDS = Gauge('gmt_scheduler_lag_seconds', 'Dispatch time minus fire_at for the last reminder')
+SCHEDULER_LAG = Histogram(
+    'gmt_scheduler_lag_distribution_seconds', 'Dispatch time minus fire_at per reminder',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+MISSED_REMINDERS_TOTAL = Counter('gmt_missed_reminders_total', 'Reminders dispatched after their grace period, by action')
+REGISTRATION_FLUSH_SIZE = Histogram(
+    'gmt_registration_flush_size', 'User changes written per registration flush',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+HTTP_REQUEST_SECONDS = Histogram('gmt_http_request_seconds', 'Latency of admin server requests')
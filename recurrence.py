@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from datetime import date as Date, datetime, timedelta
+from typing import Optional, Tuple
+
+# Supported subset of RFC 5545 recurrence rules
+FREQUENCIES = ('DAILY', 'WEEKLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Plain-word rules accepted in place of an RRULE
+SHORTCUTS = {'daily': 'FREQ=DAILY', 'weekly': 'FREQ=WEEKLY'}
+
+DATE_FORMAT = '%d/%m/%Y'
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    """A parsed FREQ=DAILY|WEEKLY rule with optional INTERVAL, BYDAY, COUNT and UNTIL
+
+    Only the occurrence after a given one is ever computed, so a series
+    costs one reminder row however long it runs.
+    """
+    freq: str
+    interval: int = 1
+    byday: Tuple[int, ...] = ()
+    count: Optional[int] = None
+    until: Optional[Date] = None
+
+    @classmethod
+    def parse(cls, text: str) -> 'RecurrenceRule':
+        """Parse an RRULE string or shortcut; raises ValueError if it is outside the supported subset"""
+        text = str(text).strip()
+        text = SHORTCUTS.get(text.lower(), text)
+        if text.upper().startswith('RRULE:'):
+            text = text[6:]
+
+        parts = {}
+        for part in text.split(';'):
+            if not part.strip():
+                continue
+            name, sep, value = part.partition('=')
+            if not sep:
+                raise ValueError(f"Malformed recurrence part: {part}")
+            parts[name.strip().upper()] = value.strip().upper()
+
+        freq = parts.pop('FREQ', None)
+        if freq not in FREQUENCIES:
+            raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+        interval = int(parts.pop('INTERVAL', '1'))
+        if interval < 1:
+            raise ValueError("INTERVAL must be at least 1")
+
+        byday: Tuple[int, ...] = ()
+        if 'BYDAY' in parts:
+            days = parts.pop('BYDAY').split(',')
+            if freq != 'WEEKLY' or not all(day in WEEKDAYS for day in days):
+                raise ValueError("BYDAY takes MO..SU and is only supported with FREQ=WEEKLY")
+            byday = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+
+        count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+        if count is not None and count < 1:
+            raise ValueError("COUNT must be at least 1")
+        until = datetime.strptime(parts.pop('UNTIL')[:8], '%Y%m%d').date() if 'UNTIL' in parts else None
+        if count is not None and until is not None:
+            raise ValueError("COUNT and UNTIL cannot be combined")
+
+        if parts:
+            raise ValueError(f"Unsupported recurrence parts: {', '.join(sorted(parts))}")
+        return cls(freq, interval, byday, count, until)
+
+    def __str__(self) -> str:
+        """Canonical RRULE form, as stored in the database"""
+        parts = [f'FREQ={self.freq}']
+        if self.interval != 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.byday:
+            parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in self.byday))
+        if self.count is not None:
+            parts.append(f'COUNT={self.count}')
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%d')}")
+        return ';'.join(parts)
+
+    def next_date(self, current: Date, occurrence: int) -> Optional[Date]:
+        """Date of the occurrence after `current`, which is occurrence number `occurrence` (from 1)
+
+        Returns None once the series is exhausted by COUNT or UNTIL.
+        """
+        if self.count is not None and occurrence >= self.count:
+            return None
+
+        if self.freq == 'DAILY':
+            candidate = current + timedelta(days=self.interval)
+        elif not self.byday:
+            candidate = current + timedelta(weeks=self.interval)
+        else:
+            # Later day in the same week, else the first day of the next week in the series
+            later = [day for day in self.byday if day > current.weekday()]
+            week_start = current - timedelta(days=current.weekday())
+            if later:
+                candidate = week_start + timedelta(days=later[0])
+            else:
+                candidate = week_start + timedelta(weeks=self.interval, days=self.byday[0])
+
+        if self.until is not None and candidate > self.until:
+            return None
+        return candidate
+
+
+def normalize_recurrence(text: Optional[str]) -> Optional[str]:
+    """Canonical rule string for storage, or None for a one-off reminder"""
+    if text is None or not str(text).strip():
+        return None
+    return str(RecurrenceRule.parse(text))
+
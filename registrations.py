@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from database import VALID_CATEGORIES, AsyncDatabase
+from metrics import REGISTRATION_FLUSH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# A buffered registration is written within this many milliseconds, or sooner once this many are pending
+DEFAULT_FLUSH_INTERVAL_MS = 200
+DEFAULT_FLUSH_ROWS = 500
+
+# (username, category) to upsert, or None to delete the user
+Change = Optional[Tuple[Optional[str], str]]
+
+
+class RegistrationBuffer:
+    """Coalesces /start, category and /stop writes into periodic batched transactions
+
+    Handlers record a user's new category here and reply at once; the
+    changes are flushed with one executemany per batch, and the latest
+    change per user wins. Reads of a user's category see buffered changes,
+    so a user always gets back the category they just chose. A crash loses
+    at most the last flush interval of registrations.
+    """
+
+    def __init__(self, db: AsyncDatabase, flush_interval: Optional[float] = None, flush_rows: Optional[int] = None):
+        self.db = db
+        self.flush_interval = flush_interval or int(os.getenv('REGISTRATION_FLUSH_MS', DEFAULT_FLUSH_INTERVAL_MS)) / 1000
+        self.flush_rows = flush_rows or int(os.getenv('REGISTRATION_FLUSH_ROWS', DEFAULT_FLUSH_ROWS))
+        self._pending: Dict[int, Change] = {}
+        # Changes handed to the database but not committed yet, still visible to reads
+        self._flushing: Dict[int, Change] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _lookup(self, user_id: int) -> Tuple[bool, Change]:
+        for changes in (self._pending, self._flushing):
+            if user_id in changes:
+                return True, changes[user_id]
+        return False, None
+
+    async def get_category(self, user_id: int) -> Optional[str]:
+        """The user's category, including changes that have not been written yet"""
+        buffered, change = self._lookup(user_id)
+        if buffered:
+            return change[1] if change else None
+        return await self.db.get_user_category(user_id)
+
+    def set(self, user_id: int, username: Optional[str], category: str) -> None:
+        """Register a user or change their category; raises ValueError for an unknown category"""
+        if category not in VALID_CATEGORIES:
+            raise ValueError(f"Invalid category: {category}")
+        self._record(user_id, (username, category.lower()))
+
+    def remove(self, user_id: int) -> None:
+        self._record(user_id, None)
+
+    def _record(self, user_id: int, change: Change) -> None:
+        self._pending[user_id] = change
+        if len(self._pending) >= self.flush_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # A flush already running picks the new changes up when it finishes
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Write every buffered change in one transaction per batch"""
+        # Let a flush already in progress commit first, so everything recorded so far is written on return
+        running = self._flush_task
+        if running is not None and running is not asyncio.current_task() and not running.done():
+            await asyncio.shield(running)
+        while self._pending:
+            self._flushing, self._pending = self._pending, {}
+            upserts = [(user_id, *change) for user_id, change in self._flushing.items() if change]
+            removals = [user_id for user_id, change in self._flushing.items() if not change]
+            try:
+                await self.db.apply_user_changes(upserts, removals)
+                REGISTRATION_FLUSH_SIZE.observe(len(self._flushing))
+            except Exception as e:
+                logger.error("Failed to write %d registrations, retrying: %s", len(self._flushing), e)
+                # Changes made since the flush started are newer and take precedence
+                self._pending = {**self._flushing, **self._pending}
+                self._flushing = {}
+                self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+                return
+            self._flushing = {}
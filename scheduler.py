@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database import following_occurrence
+
+logger = logging.getLogger(__name__)
+
+# How often the scheduler reads the change log when no notification arrives
+SYNC_INTERVAL = 10.0
+
+# A reminder counts as already sent if last_sent is within this many seconds of its fire time
+SENT_TOLERANCE = 60.0
+
+# Reminders missed by more than this are never caught up, whatever the missed-reminder policy
+CATCH_UP_WINDOW = 7 * 86400.0
+
+# A reminder added this many seconds after its fire time, e.g. for the current minute, is still sent
+NEW_REMINDER_GRACE = 120.0
+
+
+class ReminderScheduler:
+    """In-memory min-heap of upcoming reminder fire times
+
+    The heap is loaded once at startup and then kept in sync incrementally
+    from the reminder_changes log: each sync applies only the inserts,
+    reschedules and deletes recorded since the last one. The web server
+    wakes the scheduler through request_sync() as soon as it changes a
+    reminder, and a periodic sync covers notifications that were lost.
+    Reminders that should have fired while the bot was down are loaded too,
+    so the caller can decide whether to send or expire them. That catch-up
+    only covers reminders scheduled before the load: one added or moved into
+    the past later is never sent, and a recurring one moves on to its next
+    occurrence.
+
+    All methods must be called from the event loop; database reads are
+    awaited on the AsyncDatabase thread and the heap is only touched here.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._heap: List[Tuple[float, int]] = []
+        self._entries: Dict[int, float] = {}
+        self._last_seq = 0
+        self._synced_at = 0.0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(self) -> None:
+        """Build the heap from every reminder that has not fired yet, including recently missed ones"""
+        self._heap = []
+        self._entries = {}
+        # Read first, so changes made during the load are applied again by sync() rather than lost
+        self._last_seq = await self.db.get_last_change_seq()
+        now = time.time()
+        for reminder in await self.db.get_upcoming_reminders(now - CATCH_UP_WINDOW):
+            if not self._already_sent(reminder, reminder['fire_at']):
+                self.add(reminder['id'], reminder['fire_at'])
+        # A series last stored too long ago to catch up on (downtime, or a start date far in the past) carries on
+        for reminder in await self.db.get_overdue_recurring_reminders(now - CATCH_UP_WINDOW):
+            await self._advance(reminder, now)
+        self._synced_at = now
+        logger.info("Scheduler loaded %s reminders", len(self._entries))
+
+    async def sync(self) -> None:
+        """Apply reminder changes logged since the last load or sync"""
+        # Cleared before reading, not when going to sleep: a notification arriving while this tick awaits the
+        # database must still wake the next wait()
+        self._wakeup.clear()
+        changes = await self.db.get_reminder_changes(self._last_seq)
+        now = time.time()
+        overdue = []
+        for seq, reminder_id, fire_at in changes:
+            self._last_seq = seq
+            if fire_at is None or fire_at < now - NEW_REMINDER_GRACE:
+                self.remove(reminder_id)
+                if fire_at is not None:
+                    overdue.append(reminder_id)
+            else:
+                self.add(reminder_id, fire_at)
+        for reminder_id in overdue:
+            reminder = await self.db.get_reminder(reminder_id)
+            if reminder and reminder['recurrence']:
+                await self._advance(reminder, now)
+            elif reminder:
+                logger.info("Reminder %s was added after its fire time, not sending it", reminder_id)
+        self._synced_at = now
+
+    async def _advance(self, reminder: Dict, now: float) -> None:
+        """Move an overdue recurring reminder to its next future occurrence and schedule that"""
+        following = following_occurrence(reminder, now)
+        if following is None:
+            return
+        logger.info("Reminder %s is overdue, moving it on to %s", reminder['id'], following[0])
+        await self.db.reschedule_reminder(reminder['id'], following)
+        self.add(reminder['id'], following[1])
+
+    def request_sync(self) -> None:
+        """Wake the broadcast loop so it syncs now instead of at the next interval"""
+        self._wakeup.set()
+
+    def _already_sent(self, reminder: Dict, fire_at: float) -> bool:
+        last_sent = reminder.get('last_sent')
+        if not last_sent:
+            return False
+        last_sent = datetime.fromisoformat(last_sent).timestamp()
+        return last_sent >= fire_at - SENT_TOLERANCE
+
+    def add(self, reminder_id: int, fire_at: float) -> None:
+        """Schedule (or reschedule) a reminder, waking the loop if it is now the earliest"""
+        if self._entries.get(reminder_id) == fire_at:
+            return
+        self._entries[reminder_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, reminder_id))
+        if self._heap[0] == (fire_at, reminder_id):
+            self._wakeup.set()
+
+    def remove(self, reminder_id: int) -> None:
+        """Unschedule a reminder; its heap entry is discarded when it surfaces"""
+        self._entries.pop(reminder_id, None)
+
+    def _discard_stale(self) -> None:
+        while self._heap:
+            fire_at, reminder_id = self._heap[0]
+            if self._entries.get(reminder_id) == fire_at:
+                return
+            heapq.heappop(self._heap)
+
+    def next_fire_at(self) -> Optional[float]:
+        """Timestamp of the earliest scheduled reminder, if any"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Tuple[int, float]]:
+        """Remove and return (reminder_id, fire_at) for every reminder due at or before now"""
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            fire_at, reminder_id = heapq.heappop(self._heap)
+            del self._entries[reminder_id]
+            due.append((reminder_id, fire_at))
+
+    def seconds_until_next(self, now: float) -> float:
+        """How long the broadcast loop may sleep before a reminder is due or the next sync"""
+        deadline = self._synced_at + SYNC_INTERVAL
+        next_fire = self.next_fire_at()
+        if next_fire is not None:
+            deadline = min(deadline, next_fire)
+        return max(0.0, deadline - now)
+
+    async def wait(self) -> None:
+        """Sleep until the next fire time or sync, or until an earlier add() or a notification since the last sync"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.seconds_until_next(time.time()))
+        except asyncio.TimeoutError:
+            pass
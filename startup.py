@@ -0,0 +1,57 @@
+"""Startup timing report
+
+Entry points mark the end of each startup phase (imports, database,
+application, ...) and call report() once ready to serve. The report is
+logged as one line; with STARTUP_PROFILE=1 it is also printed to stderr as
+a table in the style of `python -X importtime`, which can be combined
+with that flag to break the import phase down further.
+
+Profiles are timed from when this module was first imported, so entry
+points import it before anything else; the "imports" phase then covers
+every module they load after it.
+"""
+import logging
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMPORTED_AT = time.perf_counter()
+
+
+class StartupProfile:
+    """Milliseconds spent in each startup phase, measured from `started` (default: IMPORTED_AT)"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = IMPORTED_AT if started is None else started
+        self._last = self.started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """Record that `phase` ended now; it started when the previous one ended"""
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (self._last - self.started) * 1000
+
+    def table(self) -> str:
+        lines = ['startup time: self [ms] | cumulative | phase']
+        cumulative = 0.0
+        for phase, elapsed in self.phases:
+            cumulative += elapsed
+            lines.append(f'startup time: {elapsed:9.1f} | {cumulative:10.1f} | {phase}')
+        return '\n'.join(lines)
+
+    def report(self, process: str) -> None:
+        summary = ', '.join(f'{phase} {elapsed:.1f}ms' for phase, elapsed in self.phases)
+        logger.info(
+            "%s started in %.1fms (%s)", process, self.total_ms, summary,
+            extra={'startup_ms': round(self.total_ms, 1), 'phases': {phase: round(ms, 1) for phase, ms in self.phases}}
+        )
+        if os.getenv('STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes'):
+            print(self.table(), file=sys.stderr)
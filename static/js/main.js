@@ -34,15 +34,19 @@ document.addEventListener('DOMContentLoaded', function() {
             filterButtons.forEach(btn => btn.classList.remove('active'));
             this.classList.add('active');
 
-            // Filter reminders
-            const filter = this.getAttribute('data-filter');
-            filterReminders(filter);
+            // Reload reminders for the selected category
+            loadReminders();
         });
     });
 
     // Load existing reminders
     loadReminders();
 
+    // Load the next page on demand
+    document.getElementById('loadMore').addEventListener('click', function() {
+        loadReminders(nextCursor);
+    });
+
     // Handle form submission
     document.getElementById('reminderForm').addEventListener('submit', async function(e) {
         e.preventDefault();
@@ -67,6 +71,16 @@ document.addEventListener('DOMContentLoaded', function() {
             categories: categories.join(',')
         };
 
+        // Optional repeat rule, limited to a number of occurrences if one is given
+        let recurrence = document.getElementById('recurrence').value;
+        const occurrences = document.getElementById('occurrences').value;
+        if (recurrence && occurrences) {
+            recurrence += `;COUNT=${occurrences}`;
+        }
+        if (recurrence) {
+            reminder.recurrence = recurrence;
+        }
+
         try {
             const response = await fetch('/api/reminders', {
                 method: 'POST',
@@ -85,7 +99,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 loadReminders();
                 alert('Reminder added successfully!');
             } else {
-                alert('Failed to add reminder');
+                const result = await response.json().catch(() => ({}));
+                alert(result.error || 'Failed to add reminder');
             }
         } catch (error) {
             console.error('Error:', error);
@@ -94,62 +109,68 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-async function loadReminders() {
+// Cursor for the next page of reminders, or null when everything is loaded
+let nextCursor = null;
+
+async function loadReminders(cursor = null) {
     try {
-        const response = await fetch('/api/reminders');
-        const reminders = await response.json();
-        
+        const params = new URLSearchParams();
+        const activeFilter = document.querySelector('[data-filter].active').getAttribute('data-filter');
+        if (activeFilter !== 'all') {
+            params.set('category', activeFilter);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+
+        const response = await fetch(`/api/reminders?${params}`);
+        const page = await response.json();
+
         const remindersList = document.getElementById('remindersList');
-        remindersList.innerHTML = '';
-
-        reminders.forEach(reminder => {
-            const item = document.createElement('div');
-            item.className = 'list-group-item reminder-item';
-            item.setAttribute('data-categories', reminder.categories);
-            
-            // Create category badges
-            const categories = reminder.categories.split(',');
-            const categoryBadges = categories.map(category => 
-                `<span class="badge bg-primary me-1">${category.toUpperCase()}</span>`
-            ).join('');
-
-            item.innerHTML = `
-                <div class="d-flex justify-content-between align-items-center">
-                    <div>
-                        <div class="reminder-time">📅 ${reminder.date} at ${reminder.time}</div>
-                        <div class="reminder-message">${reminder.message}</div>
-                        <div class="reminder-categories mt-2">
-                            ${categoryBadges}
-                        </div>
-                    </div>
-                    <button class="btn btn-danger btn-sm delete-reminder" 
-                            onclick="deleteReminder(${reminder.id})">
-                        Delete
-                    </button>
-                </div>
-            `;
-            remindersList.appendChild(item);
-        });
+        // A fresh load replaces the list; further pages are appended
+        if (!cursor) {
+            remindersList.innerHTML = '';
+        }
+        page.reminders.forEach(reminder => remindersList.appendChild(renderReminder(reminder)));
 
-        // Apply current filter
-        const activeFilter = document.querySelector('[data-filter].active').getAttribute('data-filter');
-        filterReminders(activeFilter);
+        nextCursor = page.next_cursor;
+        document.getElementById('loadMore').style.display = nextCursor ? 'block' : 'none';
     } catch (error) {
         console.error('Error:', error);
     }
 }
 
-function filterReminders(filter) {
-    const reminders = document.querySelectorAll('.reminder-item');
-    
-    reminders.forEach(reminder => {
-        const categories = reminder.getAttribute('data-categories').split(',');
-        if (filter === 'all' || categories.includes('all') || categories.includes(filter)) {
-            reminder.style.display = 'block';
-        } else {
-            reminder.style.display = 'none';
-        }
-    });
+function renderReminder(reminder) {
+    const item = document.createElement('div');
+    item.className = 'list-group-item reminder-item';
+    item.id = `reminder-${reminder.id}`;
+    item.setAttribute('data-categories', reminder.categories);
+
+    // Create category badges
+    const categories = reminder.categories.split(',');
+    const categoryBadges = categories.map(category => 
+        `<span class="badge bg-primary me-1">${category.toUpperCase()}</span>`
+    ).join('');
+    const repeatBadge = reminder.recurrence
+        ? `<span class="badge bg-secondary me-1" title="${reminder.recurrence}">🔁 Repeats</span>`
+        : '';
+
+    item.innerHTML = `
+        <div class="d-flex justify-content-between align-items-center">
+            <div>
+                <div class="reminder-time">📅 ${reminder.date} at ${reminder.time}</div>
+                <div class="reminder-message">${reminder.message}</div>
+                <div class="reminder-categories mt-2">
+                    ${categoryBadges}${repeatBadge}
+                </div>
+            </div>
+            <button class="btn btn-danger btn-sm delete-reminder" 
+                    onclick="deleteReminder(${reminder.id})">
+                Delete
+            </button>
+        </div>
+    `;
+    return item;
 }
 
 async function deleteReminder(id) {
@@ -163,7 +184,11 @@ async function deleteReminder(id) {
         });
 
         if (response.ok) {
-            loadReminders();
+            // Drop just this item instead of reloading the whole list
+            const item = document.getElementById(`reminder-${id}`);
+            if (item) {
+                item.remove();
+            }
         } else {
             alert('Failed to delete reminder');
         }
@@ -0,0 +1,23 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import IST, Database  # noqa: E402 - needs the path set up above
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'data' / 'reminders.db'))
+    yield database
+    database.pool.close_all()
+
+
+def date_and_time(timestamp: float):
+    """The (dd/mm/YYYY, HH:MM) IST strings a reminder firing at `timestamp` is stored with"""
+    moment = datetime.fromtimestamp(timestamp, IST)
+    return moment.strftime('%d/%m/%Y'), moment.strftime('%H:%M')
@@ -0,0 +1,28 @@
+import asyncio
+
+from change_notify import listen_for_changes, notify_reminders_changed
+
+
+def test_notifications_reach_the_listener(tmp_path, monkeypatch):
+    monkeypatch.setenv('REMINDER_NOTIFY_SOCKET', str(tmp_path / 'scheduler.sock'))
+
+    async def scenario():
+        received = asyncio.Event()
+        transport = await listen_for_changes(received.set)
+        try:
+            notify_reminders_changed()
+            await asyncio.wait_for(received.wait(), 1)
+        finally:
+            transport.close()
+
+    asyncio.run(scenario())
+
+
+def test_notifying_without_a_listener_is_harmless(tmp_path, monkeypatch):
+    monkeypatch.setenv('REMINDER_NOTIFY_SOCKET', str(tmp_path / 'missing.sock'))
+    notify_reminders_changed()
+
+
+def test_push_can_be_disabled(monkeypatch):
+    monkeypatch.setenv('REMINDER_NOTIFY_SOCKET', '')
+    assert asyncio.run(listen_for_changes(lambda: None)) is None
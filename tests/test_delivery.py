@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from telegram.error import Forbidden, TimedOut
+
+from delivery import DeliveryEngine, TokenBucket
+
+
+class FakeBot:
+    """Records sendMessage calls; `failures` maps a chat id to errors raised by its next sends"""
+
+    def __init__(self, failures=None):
+        self.sent = []
+        self.failures = failures or {}
+
+    async def send_message(self, chat_id, **payload):
+        errors = self.failures.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, payload['text'], time.monotonic()))
+
+
+def broadcast(bot, chat_ids, payloads, **settings):
+    settings = {'workers': 4, 'global_rate': 1000.0, 'per_chat_rate': 1000.0, 'max_attempts': 3, **settings}
+
+    async def scenario():
+        engine = DeliveryEngine(bot, **settings)
+        try:
+            return await engine.broadcast(chat_ids, payloads)
+        finally:
+            await engine.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_every_part_reaches_every_chat():
+    bot = FakeBot()
+    result = broadcast(bot, range(1, 21), [{'text': 'one'}, {'text': 'two'}])
+
+    assert (result.total, result.sent, result.failed) == (20, 20, 0)
+    assert sorted((chat_id, text) for chat_id, text, _ in bot.sent) == [
+        (chat_id, text) for chat_id in range(1, 21) for text in ('one', 'two')
+    ]
+
+
+def test_personalized_payloads_go_to_their_own_chat():
+    bot = FakeBot()
+    broadcast(bot, [1, 2], {1: [{'text': 'Hi 1'}], 2: [{'text': 'Hi 2'}]})
+    assert sorted((chat_id, text) for chat_id, text, _ in bot.sent) == [(1, 'Hi 1'), (2, 'Hi 2')]
+
+
+def test_a_retry_does_not_repeat_parts_already_sent():
+    bot = FakeBot()
+    sends = []
+
+    async def flaky(chat_id, **payload):
+        sends.append(payload['text'])
+        if payload['text'] == 'two' and sends.count('two') == 1:
+            raise TimedOut()
+
+    bot.send_message = flaky
+    result = broadcast(bot, [1], [{'text': 'one'}, {'text': 'two'}])
+
+    assert sends == ['one', 'two', 'two']
+    assert (result.sent, result.retries) == (1, 1)
+
+
+def test_permanent_errors_are_not_retried():
+    bot = FakeBot({1: [Forbidden('bot was blocked by the user')]})
+    result = broadcast(bot, [1, 2], [{'text': 'hi'}])
+
+    assert (result.sent, result.failed, result.retries) == (1, 1, 0)
+    assert result.errors == {'Forbidden': 1}
+    assert (1, 'failed', 1, 'Forbidden') in result.outcomes
+
+
+def test_no_backoff_after_the_last_attempt():
+    bot = FakeBot({1: [TimedOut()]})
+    started = time.monotonic()
+    result = broadcast(bot, [1], [{'text': 'hi'}], max_attempts=1)
+
+    assert result.failed == 1
+    assert time.monotonic() - started < 1
+
+
+def test_sends_to_one_chat_are_spaced_out():
+    bot = FakeBot()
+    broadcast(bot, [1], [{'text': 'one'}, {'text': 'two'}, {'text': 'three'}], per_chat_rate=20.0)
+
+    times = [sent_at for _, _, sent_at in bot.sent]
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:]))
+
+
+def test_token_bucket_limits_the_rate_after_the_burst():
+    async def scenario():
+        bucket = TokenBucket(rate=100.0, capacity=5)
+        started = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Five tokens are available at once, the other ten take 10ms each
+    assert 0.09 <= asyncio.run(scenario()) < 0.5
+
+
+def test_draining_the_bucket_pauses_sends():
+    async def scenario():
+        bucket = TokenBucket(rate=100.0)
+        bucket.drain(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.1
@@ -0,0 +1,32 @@
+from http_client import broadcast_bot, command_request, make_request, updates_request
+
+
+def limits(request):
+    # python-telegram-bot is pinned, so its HTTPX client settings are safe to inspect
+    return request._client_kwargs['limits']
+
+
+def test_each_kind_of_traffic_gets_its_own_pool(monkeypatch):
+    monkeypatch.setenv('COMMAND_POOL_SIZE', '8')
+    assert limits(updates_request()).max_connections == 1
+    assert limits(command_request()).max_connections == 8
+
+
+def test_broadcast_pool_matches_the_delivery_workers(monkeypatch):
+    monkeypatch.delenv('BROADCAST_POOL_SIZE', raising=False)
+    monkeypatch.setenv('DELIVERY_WORKERS', '24')
+    bot = broadcast_bot('1:token')
+    # The same request object serves both API calls and file downloads
+    assert limits(bot._request[1]).max_connections == 24
+
+    monkeypatch.setenv('BROADCAST_POOL_SIZE', '40')
+    assert limits(broadcast_bot('1:token')._request[1]).max_connections == 40
+    assert limits(broadcast_bot('1:token', pool_size=2)._request[1]).max_connections == 2
+
+
+def test_timeouts_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('TELEGRAM_POOL_TIMEOUT', '1.5')
+    monkeypatch.setenv('TELEGRAM_READ_TIMEOUT', '20')
+    timeout = make_request(4)._client_kwargs['timeout']
+
+    assert (timeout.pool, timeout.read, timeout.connect) == (1.5, 20.0, 5.0)
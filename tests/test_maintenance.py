@@ -0,0 +1,11 @@
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from maintenance import quiet_time
+
+
+def test_quiet_time_uses_the_zones_current_offset(monkeypatch):
+    monkeypatch.setenv('MAINTENANCE_HOUR', '4')
+    at = datetime.combine(date(2026, 10, 18), quiet_time(pytz.timezone('Asia/Kolkata')))
+    assert (at.hour, at.utcoffset()) == (4, timedelta(hours=5, minutes=30))
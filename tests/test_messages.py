@@ -0,0 +1,103 @@
+import pytest
+
+from messages import (
+    REMINDER_FOOTER, REMINDER_HEADER, TELEGRAM_MAX_LENGTH, CompiledMessage, PayloadCache, format_countdown,
+    parse_template, split_text,
+)
+
+
+def texts(payloads):
+    return [payload['text'] for payload in payloads]
+
+
+def test_static_message_keeps_valid_markdown():
+    compiled = CompiledMessage('*Exam* tomorrow')
+    assert not compiled.personalized
+    assert texts(compiled.render([1], {}, 0)) == [REMINDER_HEADER + '*Exam* tomorrow' + REMINDER_FOOTER]
+
+
+def test_static_message_escapes_broken_markdown():
+    payloads = CompiledMessage('use snake_case').render([1], {}, 0)
+    assert texts(payloads) == [REMINDER_HEADER + 'use snake\\_case' + REMINDER_FOOTER]
+
+
+def test_usernames_are_escaped():
+    compiled = CompiledMessage('Hi {username}, *quiz* today')
+    by_user = compiled.render([1, 2], {1: ('foo_bar', 'bs'), 2: (None, 'bs')}, 0)
+    assert texts(by_user[1]) == [REMINDER_HEADER + 'Hi foo\\_bar, *quiz* today' + REMINDER_FOOTER]
+    assert texts(by_user[2]) == [REMINDER_HEADER + 'Hi there, *quiz* today' + REMINDER_FOOTER]
+
+
+def test_literal_markdown_is_escaped_if_a_placeholder_could_break_it():
+    payloads = CompiledMessage('{category}_notes').render([1], {1: ('a', 'bs')}, 0)[1]
+    assert texts(payloads) == [REMINDER_HEADER + 'BS\\_notes' + REMINDER_FOOTER]
+
+
+def test_recipients_with_the_same_text_share_payloads():
+    by_user = CompiledMessage('Hello {category}').render([1, 2, 3], {1: ('a', 'bs'), 2: ('b', 'bs'), 3: ('c', 'bsc')}, 0)
+    assert by_user[1] is by_user[2]
+    assert by_user[1] is not by_user[3]
+
+
+def test_long_message_is_split_with_header_and_footer_once():
+    payloads = CompiledMessage('\n'.join(['line of a long announcement'] * 400)).render([1], {}, 0)
+    assert len(payloads) > 1
+    assert all(len(text) <= TELEGRAM_MAX_LENGTH for text in texts(payloads))
+    assert payloads[0]['text'].startswith(REMINDER_HEADER)
+    assert payloads[-1]['text'].endswith(REMINDER_FOOTER)
+    assert sum(text.count(REMINDER_HEADER) for text in texts(payloads)) == 1
+
+
+def test_long_template_is_split_per_recipient():
+    compiled = CompiledMessage('{username} ' + 'word ' * 1000)
+    payloads = compiled.render([1], {1: ('x' * 32, 'bs')}, 0)[1]
+    assert len(payloads) == 2
+    assert payloads[0]['text'].startswith(REMINDER_HEADER + 'x' * 32)
+    assert all(len(text) <= TELEGRAM_MAX_LENGTH for text in texts(payloads))
+
+
+def test_split_keeps_an_escape_with_its_character():
+    assert split_text('a' * 9 + '\\_', 10) == ['a' * 9, '\\_']
+
+
+def test_split_prefers_line_breaks():
+    assert split_text('first line\nsecond', 12) == ['first line', 'second']
+
+
+def test_countdown_is_rendered_per_batch():
+    compiled = CompiledMessage('Due in {countdown:01/01/2030 10:00}')
+    deadline = compiled.deadlines['countdown_0']
+    assert not compiled.personalized
+    assert texts(compiled.render([1], {}, deadline - 2 * 86400 - 5 * 3600)) == [
+        REMINDER_HEADER + 'Due in 2 days 5 hours' + REMINDER_FOOTER
+    ]
+
+
+def test_format_countdown():
+    assert format_countdown(30) == 'less than a minute'
+    assert format_countdown(61) == '1 minute'
+    assert format_countdown(86400 + 3600 + 60) == '1 day 1 hour'
+
+
+@pytest.mark.parametrize('template', ['{name}', '{username', '{countdown:tomorrow}', '{username!r}', '{category:>5}'])
+def test_invalid_templates_are_rejected(template):
+    with pytest.raises(ValueError):
+        parse_template(template)
+
+
+def test_invalid_template_saved_earlier_is_sent_as_written():
+    compiled = CompiledMessage('{name}')
+    assert texts(compiled.render([1], {}, 0)) == [REMINDER_HEADER + '{name}' + REMINDER_FOOTER]
+
+
+def test_templates_are_compiled_once_per_reminder_version():
+    cache = PayloadCache(max_size=2)
+    first = cache.get({'id': 1, 'version': 1, 'message': 'Hi {username}'})
+    assert cache.get({'id': 1, 'version': 1, 'message': 'Hi {username}'}) is first
+
+    edited = cache.get({'id': 1, 'version': 2, 'message': 'Hello {username}'})
+    assert edited is not first and edited.personalized
+
+    # The least recently used entry is evicted
+    cache.get({'id': 2, 'version': 1, 'message': 'Exam'})
+    assert cache.get({'id': 1, 'version': 1, 'message': 'Hi {username}'}) is not first
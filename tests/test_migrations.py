@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import SCHEMA_VERSION, Database, fire_timestamp
+
+USERS_TABLE = '''
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        category TEXT CHECK(category IN ('foundation', 'diploma', 'bsc', 'bs')),
+        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Schemas created by the bot before databases were versioned
+BASELINE_SCHEMAS = {
+    'baseline': USERS_TABLE + ''';
+        CREATE TABLE reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            time TEXT NOT NULL,
+            date TEXT NOT NULL,
+            message TEXT NOT NULL,
+            categories TEXT NOT NULL DEFAULT 'all',
+            last_sent TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'before categories': USERS_TABLE + ''';
+        CREATE TABLE reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            time TEXT NOT NULL,
+            date TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+}
+
+
+@pytest.fixture(params=sorted(BASELINE_SCHEMAS))
+def baseline_db(request, tmp_path):
+    path = str(tmp_path / 'data' / 'reminders.db')
+    (tmp_path / 'data').mkdir()
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMAS[request.param])
+    conn.executemany('INSERT INTO users (user_id, username, category) VALUES (?, ?, ?)', [
+        (1, 'alice', 'bs'), (2, None, 'diploma'),
+    ])
+    conn.execute("INSERT INTO reminders (time, date, message) VALUES ('10:00', '01/01/2030', 'Exam')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_baseline_database_migrates_to_current_schema(baseline_db):
+    db = Database(baseline_db)
+    try:
+        conn = db.connection()
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+
+        reminder = db.get_reminder(1)
+        assert reminder['categories'] == 'all'
+        assert reminder['fire_at'] == fire_timestamp('01/01/2030', '10:00')
+        assert reminder['recurrence'] is None and reminder['occurrences'] == 1
+        assert [r['id'] for r in db.list_reminders(10, category='bs')] == [1]
+
+        assert db.get_user_category(1) == 'bs'
+        assert sorted(db.get_recipient_ids(['all'])) == [1, 2]
+        assert db.get_user_preferences(1) == (None, None, None)
+
+        # Triggers added by later migrations see new rows
+        reminder_id = db.add_reminder('02/01/2030', '09:00', 'Results', 'bs', 'daily')
+        assert db.get_reminder_changes(0)[-1][1:] == (reminder_id, fire_timestamp('02/01/2030', '09:00'))
+    finally:
+        db.pool.close_all()
+
+
+def test_reopening_a_migrated_database_changes_nothing(baseline_db):
+    Database(baseline_db).pool.close_all()
+    conn = sqlite3.connect(baseline_db)
+    schema = conn.execute('SELECT sql FROM sqlite_master ORDER BY name').fetchall()
+    conn.close()
+
+    Database(baseline_db).pool.close_all()
+    conn = sqlite3.connect(baseline_db)
+    assert conn.execute('SELECT sql FROM sqlite_master ORDER BY name').fetchall() == schema
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+
+
+def test_processes_starting_together_migrate_once(baseline_db):
+    # Stands in for the bot, the web server and delivery workers opening the same file at once
+    start = threading.Barrier(4)
+    errors = []
+
+    def open_database():
+        start.wait()
+        try:
+            Database(baseline_db).pool.close_all()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_database) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    conn = sqlite3.connect(baseline_db)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute('SELECT COUNT(*) FROM reminders').fetchone()[0] == 1
+    conn.close()
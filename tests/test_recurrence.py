@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+
+from recurrence import RecurrenceRule, normalize_recurrence
+
+
+def test_daily_interval():
+    rule = RecurrenceRule.parse('FREQ=DAILY;INTERVAL=2')
+    assert rule.next_date(date(2026, 1, 30), 1) == date(2026, 2, 1)
+
+
+def test_weekly_without_byday_keeps_the_weekday():
+    rule = RecurrenceRule.parse('weekly')
+    assert rule.next_date(date(2026, 1, 5), 1) == date(2026, 1, 12)
+
+
+def test_byday_moves_to_later_day_in_the_same_week():
+    rule = RecurrenceRule.parse('FREQ=WEEKLY;BYDAY=MO,WE,FR')
+    assert rule.next_date(date(2026, 1, 5), 1) == date(2026, 1, 7)
+    assert rule.next_date(date(2026, 1, 7), 2) == date(2026, 1, 9)
+
+
+def test_byday_wraps_to_first_day_of_the_next_week_in_the_series():
+    assert RecurrenceRule.parse('FREQ=WEEKLY;BYDAY=MO,FR').next_date(date(2026, 1, 9), 1) == date(2026, 1, 12)
+    every_other_week = RecurrenceRule.parse('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR')
+    assert every_other_week.next_date(date(2026, 1, 9), 1) == date(2026, 1, 19)
+
+
+def test_count_ends_the_series():
+    rule = RecurrenceRule.parse('FREQ=DAILY;COUNT=3')
+    assert rule.next_date(date(2026, 1, 1), 2) == date(2026, 1, 2)
+    assert rule.next_date(date(2026, 1, 2), 3) is None
+
+
+def test_until_is_inclusive():
+    rule = RecurrenceRule.parse('FREQ=DAILY;UNTIL=20260110')
+    assert rule.next_date(date(2026, 1, 9), 1) == date(2026, 1, 10)
+    assert rule.next_date(date(2026, 1, 10), 2) is None
+
+
+def test_until_cuts_off_a_weekly_byday_series():
+    rule = RecurrenceRule.parse('FREQ=WEEKLY;BYDAY=MO,FR;UNTIL=20260111')
+    assert rule.next_date(date(2026, 1, 9), 1) is None
+
+
+@pytest.mark.parametrize('text', [
+    'FREQ=MONTHLY',
+    'FREQ=DAILY;BYDAY=MO',
+    'FREQ=WEEKLY;BYDAY=XX',
+    'FREQ=DAILY;INTERVAL=0',
+    'FREQ=DAILY;COUNT=0',
+    'FREQ=DAILY;COUNT=2;UNTIL=20260101',
+    'FREQ=DAILY;BYMONTH=1',
+])
+def test_unsupported_rules_are_rejected(text):
+    with pytest.raises(ValueError):
+        RecurrenceRule.parse(text)
+
+
+def test_normalize_recurrence():
+    assert normalize_recurrence(None) is None
+    assert normalize_recurrence('  ') is None
+    assert normalize_recurrence('daily') == 'FREQ=DAILY'
+    assert normalize_recurrence('RRULE:freq=weekly;byday=fr,mo;interval=1') == 'FREQ=WEEKLY;BYDAY=MO,FR'
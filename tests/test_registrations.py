@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from database import AsyncDatabase
+from registrations import RegistrationBuffer
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reads_see_changes_before_they_are_written(db):
+    async def scenario():
+        buffer = RegistrationBuffer(AsyncDatabase(db), flush_interval=60, flush_rows=100)
+        buffer.set(1, 'alice', 'bs')
+        assert await buffer.get_category(1) == 'bs'
+        assert db.get_user_category(1) is None
+
+        await buffer.flush()
+        assert len(buffer) == 0
+
+    run(scenario())
+    assert db.get_user_category(1) == 'bs'
+
+
+def test_latest_change_per_user_wins(db):
+    db.add_user(2, 'bob', 'diploma')
+
+    async def scenario():
+        buffer = RegistrationBuffer(AsyncDatabase(db), flush_interval=60, flush_rows=100)
+        buffer.set(1, 'alice', 'bs')
+        buffer.remove(1)
+        buffer.remove(2)
+        buffer.set(2, 'bob', 'foundation')
+        assert len(buffer) == 2
+        assert await buffer.get_category(1) is None
+        await buffer.flush()
+
+    run(scenario())
+    assert db.get_user_category(1) is None
+    assert db.get_user_category(2) == 'foundation'
+
+
+def test_flushes_after_the_interval_or_once_enough_are_pending(db):
+    async def scenario():
+        buffer = RegistrationBuffer(AsyncDatabase(db), flush_interval=0.05, flush_rows=3)
+        buffer.set(1, None, 'bs')
+        await asyncio.sleep(0.2)
+        assert db.get_user_category(1) == 'bs'
+
+        buffer = RegistrationBuffer(AsyncDatabase(db), flush_interval=60, flush_rows=3)
+        for user_id in (2, 3, 4):
+            buffer.set(user_id, None, 'bsc')
+        await buffer._flush_task
+
+    run(scenario())
+    assert [db.get_user_category(user_id) for user_id in (2, 3, 4)] == ['bsc'] * 3
+
+
+def test_unknown_categories_are_rejected(db):
+    async def scenario():
+        buffer = RegistrationBuffer(AsyncDatabase(db), flush_interval=60, flush_rows=100)
+        with pytest.raises(ValueError):
+            buffer.set(1, None, 'phd')
+        assert len(buffer) == 0
+
+    run(scenario())
+
+
+def test_a_failed_flush_keeps_newer_changes(db):
+    class FailingOnce(AsyncDatabase):
+        buffer = None
+
+        async def apply_user_changes(self, upserts, removals):
+            if self.buffer is not None:
+                buffer, self.buffer = self.buffer, None
+                # A change recorded while the write is in flight
+                buffer.set(1, 'alice', 'diploma')
+                raise OSError('disk full')
+            await self.run(self.sync.apply_user_changes, upserts, removals)
+
+    async def scenario():
+        database = FailingOnce(db)
+        buffer = database.buffer = RegistrationBuffer(database, flush_interval=0.05, flush_rows=100)
+        buffer.set(1, 'alice', 'bs')
+        buffer.set(2, 'bob', 'bs')
+        await buffer.flush()
+        assert len(buffer) == 2
+        # Retried on the next interval
+        await asyncio.sleep(0.2)
+        assert len(buffer) == 0
+
+    run(scenario())
+    assert (db.get_user_category(1), db.get_user_category(2)) == ('diploma', 'bs')
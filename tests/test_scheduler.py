@@ -0,0 +1,176 @@
+import asyncio
+import time
+from datetime import datetime
+
+from conftest import date_and_time
+from database import IST, AsyncDatabase
+from scheduler import CATCH_UP_WINDOW, ReminderScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_pop_due_returns_reminders_in_firing_order():
+    scheduler = ReminderScheduler(db=None)
+    scheduler.add(1, 300.0)
+    scheduler.add(2, 100.0)
+    scheduler.add(3, 200.0)
+
+    assert scheduler.next_fire_at() == 100.0
+    assert scheduler.pop_due(250.0) == [(2, 100.0), (3, 200.0)]
+    assert scheduler.pop_due(250.0) == []
+    assert len(scheduler) == 1 and scheduler.next_fire_at() == 300.0
+
+
+def test_rescheduling_replaces_the_earlier_entry():
+    scheduler = ReminderScheduler(db=None)
+    scheduler.add(1, 100.0)
+    scheduler.add(1, 500.0)
+
+    assert scheduler.pop_due(200.0) == []
+    assert scheduler.next_fire_at() == 500.0
+    assert scheduler.pop_due(500.0) == [(1, 500.0)]
+
+
+def test_removed_reminders_never_fire():
+    scheduler = ReminderScheduler(db=None)
+    scheduler.add(1, 100.0)
+    scheduler.add(2, 200.0)
+    scheduler.remove(1)
+
+    assert len(scheduler) == 1
+    assert scheduler.pop_due(1000.0) == [(2, 200.0)]
+    assert scheduler.next_fire_at() is None
+
+
+def test_seconds_until_next_is_capped_by_the_sync_interval():
+    scheduler = ReminderScheduler(db=None)
+    assert scheduler.seconds_until_next(0.0) == 10.0
+    scheduler.add(1, 4.0)
+    assert scheduler.seconds_until_next(0.0) == 4.0
+    assert scheduler.seconds_until_next(5.0) == 0.0
+
+
+def test_sync_applies_only_changes_since_the_load(db):
+    hour_ahead = time.time() + 3600
+    kept = db.add_reminder(*date_and_time(hour_ahead), 'Kept', 'all')
+    deleted = db.add_reminder(*date_and_time(hour_ahead + 60), 'Deleted', 'all')
+
+    async def scenario():
+        scheduler = ReminderScheduler(AsyncDatabase(db))
+        await scheduler.load()
+        assert len(scheduler) == 2
+
+        added = db.add_reminder(*date_and_time(hour_ahead + 120), 'Added', 'all')
+        db.delete_reminder(deleted)
+        await scheduler.sync()
+        return scheduler, added
+
+    scheduler, added = run(scenario())
+    assert [reminder_id for reminder_id, _ in scheduler.pop_due(hour_ahead + 3600)] == [kept, added]
+
+
+def scheduled_ids(scheduler, now):
+    return [reminder_id for reminder_id, _ in scheduler.pop_due(now)]
+
+
+def test_load_includes_missed_reminders_that_were_not_sent(db):
+    now = time.time()
+    missed = db.add_reminder(*date_and_time(now - 3600), 'Missed', 'all')
+    sent = db.add_reminder(*date_and_time(now - 3600), 'Sent', 'all')
+    db.update_reminder_sent(sent, datetime.fromtimestamp(now - 3590, IST).isoformat())
+    db.add_reminder(*date_and_time(now - CATCH_UP_WINDOW - 3600), 'Too old', 'all')
+
+    scheduler = ReminderScheduler(AsyncDatabase(db))
+    run(scheduler.load())
+    assert scheduled_ids(scheduler, now) == [missed]
+
+
+def test_load_moves_a_long_overdue_series_to_its_next_occurrence(db):
+    now = time.time()
+    daily = db.add_reminder(*date_and_time(now - 30 * 86400), 'Daily', 'all', 'daily')
+
+    scheduler = ReminderScheduler(AsyncDatabase(db))
+    run(scheduler.load())
+
+    fire_at = db.get_reminder(daily)['fire_at']
+    assert now < fire_at <= now + 86400
+    assert scheduler.next_fire_at() == fire_at
+
+
+def test_reminders_added_in_the_past_are_not_sent(db):
+    async def scenario():
+        scheduler = ReminderScheduler(AsyncDatabase(db))
+        await scheduler.load()
+        now = time.time()
+        late = db.add_reminder(*date_and_time(now - 600), 'Late', 'all')
+        this_minute = db.add_reminder(*date_and_time(now - 30), 'This minute', 'all')
+        await scheduler.sync()
+        return scheduler, late, this_minute
+
+    scheduler, late, this_minute = run(scenario())
+    assert scheduled_ids(scheduler, time.time()) == [this_minute]
+    assert db.get_reminder(late) is not None
+
+
+def test_a_series_added_in_the_past_carries_on(db):
+    async def scenario():
+        scheduler = ReminderScheduler(AsyncDatabase(db))
+        await scheduler.load()
+        daily = db.add_reminder(*date_and_time(time.time() - 3 * 86400), 'Daily', 'all', 'daily')
+        await scheduler.sync()
+        return scheduler, daily
+
+    scheduler, daily = run(scenario())
+    reminder = db.get_reminder(daily)
+    assert reminder['fire_at'] > time.time() and reminder['occurrences'] > 1
+    assert scheduler.next_fire_at() == reminder['fire_at']
+
+
+def test_wait_returns_as_soon_as_a_change_is_notified(db):
+    async def scenario():
+        scheduler = ReminderScheduler(AsyncDatabase(db))
+        await scheduler.load()
+        asyncio.get_running_loop().call_later(0.05, scheduler.request_sync)
+        started = time.monotonic()
+        await scheduler.wait()
+        return time.monotonic() - started
+
+    assert run(scenario()) < 1
+
+
+def test_a_notification_during_sync_is_not_lost(db):
+    class NotifiedMidSync(AsyncDatabase):
+        scheduler = None
+
+        async def get_reminder_changes(self, after_seq):
+            changes = await self.run(self.sync.get_reminder_changes, after_seq)
+            # The web server writes and notifies while this tick is still reading
+            db.add_reminder(*date_and_time(time.time() + 3600), 'New', 'all')
+            self.scheduler.request_sync()
+            return changes
+
+    async def scenario():
+        database = NotifiedMidSync(db)
+        scheduler = database.scheduler = ReminderScheduler(database)
+        await scheduler.load()
+        await scheduler.sync()
+        started = time.monotonic()
+        await scheduler.wait()
+        return time.monotonic() - started
+
+    assert run(scenario()) < 1
+
+
+def test_an_earlier_reminder_wakes_the_loop():
+    async def scenario():
+        scheduler = ReminderScheduler(db=None)
+        scheduler.add(1, time.time() + 3600)
+        scheduler._wakeup.clear()
+        asyncio.get_running_loop().call_later(0.05, scheduler.add, 2, time.time() + 60)
+        started = time.monotonic()
+        await scheduler.wait()
+        return time.monotonic() - started
+
+    assert run(scenario()) < 1
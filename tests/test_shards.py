@@ -0,0 +1,43 @@
+import time
+
+SHARDS = 4
+
+
+def test_a_single_worker_holds_every_shard(db):
+    assert db.acquire_shards('w1', SHARDS, ttl=60) == ([0, 1, 2, 3], 1)
+
+
+def test_workers_split_the_shards_evenly(db):
+    db.acquire_shards('w1', SHARDS, ttl=60)
+    # Nothing is free until the first worker hands its surplus back
+    assert db.acquire_shards('w2', SHARDS, ttl=60) == ([], 2)
+
+    assert db.acquire_shards('w1', SHARDS, ttl=60) == ([0, 1], 2)
+    assert db.acquire_shards('w2', SHARDS, ttl=60) == ([2, 3], 2)
+
+
+def test_released_shards_are_taken_over_at_once(db):
+    db.acquire_shards('w1', SHARDS, ttl=60)
+    db.release_shards('w1')
+    assert db.acquire_shards('w2', SHARDS, ttl=60) == ([0, 1, 2, 3], 1)
+
+
+def test_shards_of_a_dead_worker_are_requeued(db):
+    reminder_id = db.add_reminder('01/01/2030', '10:00', 'Exam', 'all')
+    db.enqueue_deliveries(reminder_id, range(1, 9), '2030-01-01T10:00:00', shards=SHARDS)
+    db.acquire_shards('w1', SHARDS, ttl=0.2)
+    claimed = db.claim_shard_deliveries(1, limit=10)
+    assert sorted(claimed) == [(reminder_id, 1), (reminder_id, 5)]
+
+    # w1 stops heartbeating while its deliveries are 'sending'
+    time.sleep(0.3)
+    assert db.acquire_shards('w2', SHARDS, ttl=0.2) == ([0, 1, 2, 3], 1)
+    assert sorted(db.claim_shard_deliveries(1, limit=10)) == claimed
+
+
+def test_renewed_leases_are_kept(db):
+    db.acquire_shards('w1', SHARDS, ttl=0.2)
+    time.sleep(0.1)
+    db.renew_shard_leases('w1', ttl=0.2)
+    time.sleep(0.15)
+    assert db.acquire_shards('w2', SHARDS, ttl=0.2)[0] == []
@@ -0,0 +1,74 @@
+from database import SubscriberIndex
+
+
+def loaded(rows):
+    index = SubscriberIndex()
+    index.load(rows)
+    return index
+
+
+def test_snapshots_by_category():
+    index = loaded([(3, 'bs'), (1, 'bs'), (2, 'diploma'), (4, 'foundation')])
+
+    assert list(index.snapshot(['bs'])) == [1, 3]
+    assert sorted(index.snapshot(['BS', ' diploma'])) == [1, 2, 3]
+    assert sorted(index.snapshot(['all'])) == [1, 2, 3, 4]
+    assert list(index.snapshot(['bsc'])) == []
+    assert len(index) == 4
+
+
+def test_changes_are_visible_on_the_next_read():
+    index = loaded([(1, 'bs'), (2, 'diploma')])
+    index.set(3, 'bs')
+    index.set(2, 'bs')
+    index.remove(1)
+
+    assert list(index.snapshot(['bs'])) == [2, 3]
+    assert list(index.snapshot(['diploma'])) == []
+    assert len(index) == 2
+
+
+def test_latest_change_for_a_user_wins():
+    index = loaded([(1, 'bs')])
+    index.remove(1)
+    index.set(1, 'diploma')
+    index.set(1, 'bsc')
+
+    assert list(index.snapshot(['all'])) == [1]
+    assert list(index.snapshot(['bsc'])) == [1]
+
+
+def test_snapshots_taken_earlier_never_change():
+    index = loaded([(1, 'bs'), (2, 'diploma')])
+    single = index.snapshot(['bs'])
+    union = index.snapshot(['bs', 'diploma'])
+
+    index.set(5, 'bs')
+    index.remove(2)
+
+    assert list(single) == [1] and sorted(union) == [1, 2]
+    assert list(index.snapshot(['bs'])) == [1, 5]
+    assert list(index.snapshot(['bs', 'diploma'])) == [1, 5]
+
+
+def test_unchanged_categories_are_not_copied():
+    index = loaded([(1, 'bs'), (2, 'diploma')])
+    diploma = index.snapshot(['diploma'])
+    union = index.snapshot(['bs', 'foundation'])
+    assert index.snapshot(['bs', 'foundation']) is union
+
+    index.set(3, 'bs')
+    assert index.snapshot(['diploma']) is diploma
+
+
+def test_database_keeps_the_index_in_sync(db):
+    db.add_user(1, 'alice', 'bs')
+    db.load_subscriber_index()
+
+    db.add_user(2, 'bob', 'bs')
+    db.apply_user_changes([(3, None, 'diploma'), (2, 'bob', 'diploma')], [1])
+
+    assert list(db.get_recipient_ids(['diploma'])) == [2, 3]
+    assert list(db.get_recipient_ids(['bs'])) == []
+    db.remove_user(3)
+    assert list(db.get_recipient_ids(['all'])) == [2]
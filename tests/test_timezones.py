@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from timezones import delivery_times, in_quiet_hours, parse_clock, release_time
+
+KOLKATA = pytz.timezone('Asia/Kolkata')
+LONDON = pytz.timezone('Europe/London')
+
+# 22:00 to 07:00, crossing midnight
+OVERNIGHT = ('Asia/Kolkata', 22 * 60, 7 * 60)
+
+
+def timestamp(zone, *args) -> float:
+    return zone.localize(datetime(*args)).timestamp()
+
+
+def test_in_quiet_hours_wraps_past_midnight():
+    assert in_quiet_hours(23 * 60, 22 * 60, 7 * 60)
+    assert in_quiet_hours(0, 22 * 60, 7 * 60)
+    assert not in_quiet_hours(7 * 60, 22 * 60, 7 * 60)
+    assert not in_quiet_hours(12 * 60, 22 * 60, 7 * 60)
+
+
+def test_release_before_midnight_waits_until_next_morning():
+    now = timestamp(KOLKATA, 2026, 3, 10, 23, 30)
+    assert release_time(now, OVERNIGHT) == timestamp(KOLKATA, 2026, 3, 11, 7, 0)
+
+
+def test_release_after_midnight_waits_until_the_same_morning():
+    now = timestamp(KOLKATA, 2026, 3, 11, 6, 59, 30)
+    assert release_time(now, OVERNIGHT) == timestamp(KOLKATA, 2026, 3, 11, 7, 0)
+
+
+def test_outside_quiet_hours_is_sent_now():
+    now = timestamp(KOLKATA, 2026, 3, 11, 12, 0)
+    assert release_time(now, OVERNIGHT) == now
+    assert release_time(now, ('Asia/Kolkata', None, None)) == now
+
+
+def test_release_across_a_dst_change():
+    # Clocks in London go forward from 01:00 to 02:00 on 29 March 2026
+    now = timestamp(LONDON, 2026, 3, 28, 23, 30)
+    assert release_time(now, ('Europe/London', 23 * 60, 7 * 60)) == timestamp(LONDON, 2026, 3, 29, 7, 0)
+
+
+def test_delivery_times_defaults_to_now():
+    now = timestamp(KOLKATA, 2026, 3, 10, 23, 30)
+    times = dict(delivery_times([1, 2], {2: OVERNIGHT}, now))
+    assert times == {1: now, 2: timestamp(KOLKATA, 2026, 3, 11, 7, 0)}
+
+
+def test_parse_clock():
+    assert parse_clock(' 07:30 ') == 450
+    with pytest.raises(ValueError):
+        parse_clock('25:00')
+
+
+def test_deliveries_in_quiet_hours_are_held_back(db):
+    now = datetime.now(KOLKATA)
+    start = (now.hour * 60 + now.minute - 60) % 1440
+    end = (now.hour * 60 + now.minute + 60) % 1440
+    for user_id in (1, 2):
+        db.add_user(user_id, None, 'bs')
+    assert db.set_quiet_hours(2, start, end)
+    assert db.set_user_timezone(2, 'Asia/Kolkata')
+
+    reminder_id = db.add_reminder('01/01/2030', '10:00', 'Exam', 'all')
+    assert db.enqueue_deliveries(reminder_id, [1, 2], now.isoformat()) == 1
+    assert db.claim_deliveries(reminder_id, limit=10) == [1]
+    assert 0 < db.next_deferred_delivery(reminder_id) - now.timestamp() <= 3600
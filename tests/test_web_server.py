@@ -0,0 +1,146 @@
+import base64
+import gzip
+
+import pytest
+
+from web_server import create_app
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'admin:secret').decode()}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEB_USERNAME', 'admin')
+    monkeypatch.setenv('WEB_PASSWORD', 'secret')
+    # No bot is listening in tests
+    monkeypatch.setenv('REMINDER_NOTIFY_SOCKET', '')
+    app = create_app(str(tmp_path / 'data' / 'reminders.db'))
+    yield app.test_client()
+    database = app.extensions.get('database')
+    if database is not None:
+        database.pool.close_all()
+
+
+def add(client, date, time='10:00', message='Exam', categories='all'):
+    response = client.post('/api/reminders', headers=AUTH, json={
+        'date': date, 'time': time, 'message': message, 'categories': categories,
+    })
+    assert response.status_code == 201
+
+
+def test_requires_credentials(client):
+    assert client.get('/api/reminders').status_code == 401
+    bad = {'Authorization': 'Basic ' + base64.b64encode(b'admin:wrong').decode()}
+    assert client.get('/api/reminders', headers=bad).status_code == 401
+
+
+def test_cursor_walks_every_page_in_firing_order(client):
+    for day in (5, 1, 4, 2, 3):
+        add(client, f'0{day}/01/2030', message=f'Day {day}')
+
+    messages = []
+    url = '/api/reminders?limit=2'
+    while url:
+        page = client.get(url, headers=AUTH).get_json()
+        assert len(page['reminders']) <= 2
+        messages += [reminder['message'] for reminder in page['reminders']]
+        url = page['next_cursor'] and f"/api/reminders?limit=2&cursor={page['next_cursor']}"
+
+    assert messages == [f'Day {day}' for day in range(1, 6)]
+
+
+def test_out_of_range_limits_are_clamped(client):
+    add(client, '01/01/2030')
+    add(client, '02/01/2030')
+
+    page = client.get('/api/reminders?limit=0', headers=AUTH).get_json()
+    assert len(page['reminders']) == 1 and page['next_cursor']
+    assert len(client.get('/api/reminders?limit=100000', headers=AUTH).get_json()['reminders']) == 2
+
+
+def test_filters_by_category_and_date_range(client):
+    add(client, '01/01/2030', message='Everyone')
+    add(client, '02/01/2030', message='BS', categories='bs')
+    add(client, '03/01/2030', message='Diploma', categories='diploma')
+
+    def messages(query):
+        return [r['message'] for r in client.get(f'/api/reminders?{query}', headers=AUTH).get_json()['reminders']]
+
+    assert messages('category=bs') == ['Everyone', 'BS']
+    assert messages('from=02/01/2030&to=02/01/2030') == ['BS']
+    assert client.get('/api/reminders?category=nope', headers=AUTH).status_code == 400
+    assert client.get('/api/reminders?limit=abc', headers=AUTH).status_code == 400
+
+
+def test_unchanged_list_is_not_modified(client):
+    add(client, '01/01/2030')
+    first = client.get('/api/reminders', headers=AUTH)
+    etag = first.headers['ETag']
+
+    cached = client.get('/api/reminders', headers={**AUTH, 'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+
+    add(client, '02/01/2030')
+    changed = client.get('/api/reminders', headers={**AUTH, 'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert len(changed.get_json()['reminders']) == 2
+
+
+def test_large_responses_are_compressed(client):
+    for day in range(1, 29):
+        add(client, f'{day:02d}/02/2030', message='A fairly long reminder message ' * 2)
+
+    response = client.get('/api/reminders', headers={**AUTH, 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(response.data)) > len(response.data)
+    assert 'Content-Encoding' not in client.get('/api/reminders', headers=AUTH).headers
+
+
+def bulk(client, body, content_type):
+    return client.post('/api/reminders/bulk', headers={**AUTH, 'Content-Type': content_type}, data=body)
+
+
+def test_csv_import_keeps_valid_rows_and_reports_the_rest(client):
+    body = (
+        'date,time,message,categories,recurrence\n'
+        '01/01/2030,10:00,Exam,all,\n'
+        '31/02/2030,10:00,Bad date,all,\n'
+        '02/01/2030,09:00,Quiz,bs,weekly\n'
+        '03/01/2030,09:00\n'
+    )
+    response = bulk(client, body, 'text/csv')
+
+    assert response.status_code == 201
+    result = response.get_json()
+    assert (result['inserted'], result['error_count']) == (2, 2)
+    assert [error['line'] for error in result['errors']] == [3, 5]
+    reminders = client.get('/api/reminders', headers=AUTH).get_json()['reminders']
+    assert [(r['message'], r['recurrence']) for r in reminders] == [('Exam', None), ('Quiz', 'FREQ=WEEKLY')]
+
+
+def test_json_lines_import_rejects_malformed_lines(client):
+    body = '\n'.join([
+        '{"date": "01/01/2030", "time": "10:00", "message": "Exam", "categories": "all"}',
+        'not json',
+        '{"date": "02/01/2030", "time": "10:00", "message": null, "categories": "all"}',
+        '{"date": "03/01/2030", "time": "10:00", "message": 42, "categories": "all"}',
+        '',
+    ])
+    result = bulk(client, body, 'application/x-ndjson').get_json()
+
+    assert result['inserted'] == 1
+    assert [(error['line'], error['error']) for error in result['errors']] == [
+        (2, 'Invalid JSON'),
+        (3, 'Date, time, message and categories must be text'),
+        (4, 'Date, time, message and categories must be text'),
+    ]
+
+
+def test_import_with_no_valid_rows_fails(client):
+    response = bulk(client, 'date,time,message,categories\n01/01/2030,25:00,Exam,all\n', 'text/csv')
+    assert response.status_code == 400
+    assert response.get_json()['inserted'] == 0
+
+
+def test_import_needs_a_supported_content_type(client):
+    assert bulk(client, '[]', 'application/json').status_code == 415
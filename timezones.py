@@ -0,0 +1,76 @@
+import os
+from datetime import datetime, timedelta, tzinfo
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import pytz
+
+# Zone for users who never set one with /timezone; reminder times themselves are always IST
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+
+MINUTES_PER_DAY = 24 * 60
+
+# (timezone, quiet_start, quiet_end) as stored on a user; quiet hours are minutes after local midnight
+Preferences = Tuple[Optional[str], Optional[int], Optional[int]]
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: Optional[str] = None) -> tzinfo:
+    """Zone object for an IANA name, DEFAULT_TIMEZONE for None; raises ValueError for an unknown name"""
+    name = name or os.getenv('DEFAULT_TIMEZONE', DEFAULT_TIMEZONE)
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def parse_clock(text: str) -> int:
+    """Minutes after midnight for an HH:MM time; raises ValueError if malformed"""
+    parsed = datetime.strptime(text.strip(), '%H:%M')
+    return parsed.hour * 60 + parsed.minute
+
+
+def format_clock(minutes: int) -> str:
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def in_quiet_hours(minute: int, quiet_start: int, quiet_end: int) -> bool:
+    """Whether a local minute of the day falls in [quiet_start, quiet_end), which may wrap past midnight"""
+    if quiet_start <= quiet_end:
+        return quiet_start <= minute < quiet_end
+    return minute >= quiet_start or minute < quiet_end
+
+
+def release_time(now: float, preferences: Preferences) -> float:
+    """Earliest timestamp at or after `now` that is outside the user's quiet hours"""
+    zone_name, quiet_start, quiet_end = preferences
+    if quiet_start is None or quiet_end is None or quiet_start == quiet_end:
+        return now
+    zone = get_zone(zone_name)
+    local = datetime.fromtimestamp(now, zone)
+    minute = local.hour * 60 + local.minute
+    if not in_quiet_hours(minute, quiet_start, quiet_end):
+        return now
+    # Quiet hours end at a local wall-clock time, so localize it again in case a DST change falls in between
+    end = local.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=(quiet_end - minute) % MINUTES_PER_DAY)
+    return zone.normalize(zone.localize(end)).timestamp()
+
+
+def delivery_times(
+    user_ids: Iterable[int], preferences: Dict[int, Preferences], now: float
+) -> Iterator[Tuple[int, float]]:
+    """(user_id, time the user may be sent to) per recipient; each distinct preference is computed once
+
+    Recipients sharing a release time form one delivery bucket, so a
+    broadcast goes out in waves as quiet hours end around the world.
+    """
+    release_by_preference: Dict[Preferences, float] = {}
+    for user_id in user_ids:
+        user_preferences = preferences.get(user_id)
+        if user_preferences is None:
+            yield user_id, now
+            continue
+        release = release_by_preference.get(user_preferences)
+        if release is None:
+            release = release_by_preference[user_preferences] = release_time(now, user_preferences)
+        yield user_id, release
@@ -1,72 +1,72 @@
-from flask import Flask, render_template, jsonify, request, Response
+from startup import StartupProfile  # isort: skip - must be the first import, see startup.py
+from flask import Blueprint, Flask, current_app, render_template, jsonify, request, Response, g
 import sqlite3
+import threading
+import base64
+import csv
+import gzip
+import io
+import json
+import logging
+import time
 import os
 from datetime import datetime
 import pytz
 from functools import wraps
+from typing import Optional
 from dotenv import load_dotenv
 
-app = Flask(__name__)
+import metrics
+from change_notify import notify_reminders_changed
+from database import VALID_CATEGORIES, Database, fire_timestamp
+from forecast import DEFAULT_FORECAST_DAYS, MAX_FORECAST_DAYS, candidate_reminder, forecast
+from logging_config import configure_logging
+from metrics import HTTP_REQUEST_SECONDS
+from messages import parse_template
+from recurrence import normalize_recurrence
+
 # Change DATABASE_PATH to match bot.py
 DATABASE_PATH = 'data/reminders.db'
 
-# Load environment variables
-load_dotenv('config/.env')
+logger = logging.getLogger(__name__)
+startup_profile = StartupProfile()
+
+# Page size for GET /api/reminders
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Accepted bodies for POST /api/reminders/bulk
+BULK_CONTENT_TYPES = {'text/csv', 'application/csv', 'application/x-ndjson', 'application/jsonl'}
+# Per-row errors returned by a bulk import; the rest are only counted
+MAX_BULK_ERRORS = 1000
+
+# Days of delivery history returned by GET /api/stats
+DEFAULT_STATS_DAYS = 7
+MAX_STATS_DAYS = 365
 
-# Check if required environment variables are set
-if not os.getenv('WEB_USERNAME') or not os.getenv('WEB_PASSWORD'):
-    raise ValueError("WEB_USERNAME and WEB_PASSWORD must be set in config/.env")
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
 
 # Set up the IST time zone
 IST = pytz.timezone('Asia/Kolkata')
 
-# Create database directory if it doesn't exist
-os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-
-def init_db():
-    """Initialize database with required tables"""
-    db = sqlite3.connect(DATABASE_PATH)
-    cursor = db.cursor()
-    
-    # Create users table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            category TEXT CHECK(category IN ('foundation', 'diploma', 'bsc', 'bs')),
-            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create reminders table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            time TEXT NOT NULL,
-            date TEXT NOT NULL,
-            message TEXT NOT NULL,
-            categories TEXT NOT NULL DEFAULT 'all',
-            last_sent TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    db.commit()
-    db.close()
-
-# Initialize database on startup
-init_db()
-
-def dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
-
-def get_db():
-    db = sqlite3.connect(DATABASE_PATH)
-    db.row_factory = dict_factory
-    return db
+# Routes, registered on the app by create_app()
+api = Blueprint('api', __name__)
+
+# Serializes opening the database when the first requests arrive together
+_database_lock = threading.Lock()
+
+def get_database() -> Database:
+    """The app's shared connection layer, opened (and the schema checked) on first use rather than at import"""
+    database = current_app.extensions.get('database')
+    if database is None:
+        with _database_lock:
+            database = current_app.extensions.get('database')
+            if database is None:
+                started = time.perf_counter()
+                database = current_app.extensions['database'] = Database(current_app.config['DATABASE_PATH'])
+                logger.info("Database opened in %.1fms", (time.perf_counter() - started) * 1000)
+    return database
 
 def check_auth(username, password):
     """Check if username and password match the ones in .env file"""
@@ -91,110 +91,312 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
-@app.route('/')
+@api.route('/')
 @requires_auth
 def index():
     return render_template('index.html')
 
-@app.route('/api/reminders', methods=['GET'])
+def encode_cursor(reminder):
+    """Opaque keyset cursor pointing just after the given reminder"""
+    raw = f"{reminder['fire_at']}:{reminder['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor):
+    fire_at, reminder_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+    return int(fire_at), int(reminder_id)
+
+@api.route('/api/reminders', methods=['GET'])
 @requires_auth
 def get_reminders():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute('''
-        SELECT id, time, date, message, categories
-        FROM reminders 
-        ORDER BY 
-            date, 
-            CAST(substr(time, 1, 2) AS INTEGER) * 60 + CAST(substr(time, 4, 2) AS INTEGER)
-    ''')
-    reminders = cursor.fetchall()
-    db.close()
-    return jsonify(reminders)
-
-@app.route('/api/reminders', methods=['POST'])
+    # The version counter changes with every reminder write, so an unchanged list costs one read
+    etag = f"r{get_database().get_reminders_version()}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        since = fire_timestamp(request.args['from'], '00:00') if request.args.get('from') else None
+        until = fire_timestamp(request.args['to'], '00:00') + 86400 if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, cursor or date range'}), 400
+
+    category = request.args.get('category')
+    if category in (None, '', 'all'):
+        category = None
+    elif category not in VALID_CATEGORIES:
+        return jsonify({'error': 'Invalid category'}), 400
+
+    reminders = get_database().list_reminders(limit, after=after, since=since, until=until, category=category)
+    next_cursor = encode_cursor(reminders[-1]) if len(reminders) == limit else None
+    for reminder in reminders:
+        del reminder['fire_at']
+
+    response = jsonify({'reminders': reminders, 'next_cursor': next_cursor})
+    response.set_etag(etag, weak=True)
+    # Let browsers cache the list but revalidate it with If-None-Match every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def validate_reminder(data):
+    """Return an error message for an invalid reminder, or None if it can be saved"""
+    if not isinstance(data, dict) or not all(key in data for key in ['date', 'time', 'message', 'categories']):
+        logger.debug("Missing fields in data: %s", data)
+        return 'Missing required fields'
+    # JSON null and short CSV rows give None, which must not be saved as the text 'None'
+    if not all(isinstance(data[key], str) for key in ['date', 'time', 'message', 'categories']):
+        logger.debug("Non-text fields in data: %s", data)
+        return 'Date, time, message and categories must be text'
+    if not isinstance(data.get('recurrence'), (str, type(None))):
+        return 'Invalid recurrence: must be text'
+
+    try:
+        # Validate date and time format
+        datetime.strptime(f"{data['date']} {data['time']}", '%d/%m/%Y %H:%M')
+    except (TypeError, ValueError) as e:
+        logger.debug("Date/time validation error: %s", e)
+        return 'Invalid date or time format'
+
+    # Validate categories
+    categories = data['categories'].split(',')
+    valid_categories = {'all', 'foundation', 'diploma', 'bsc', 'bs'}
+    if not all(cat.strip() in valid_categories for cat in categories):
+        logger.debug("Invalid categories: %s", categories)
+        return 'Invalid categories'
+
+    if not data['message'].strip():
+        return 'Message must not be empty'
+
+    # Placeholders are checked now so a typo never reaches thousands of users
+    try:
+        parse_template(data['message'])
+    except ValueError as e:
+        logger.debug("Invalid message template: %s", e)
+        return f'Invalid message: {e}'
+
+    # Optional repeat rule: 'daily', 'weekly' or an RRULE subset
+    try:
+        normalize_recurrence(data.get('recurrence'))
+    except ValueError as e:
+        logger.debug("Invalid recurrence: %s", e)
+        return f'Invalid recurrence: {e}'
+    return None
+
+@api.route('/api/reminders', methods=['POST'])
 @requires_auth
 def add_reminder():
     try:
         data = request.json
         
-        if not all(key in data for key in ['date', 'time', 'message', 'categories']):
-            print(f"Missing fields in data: {data}")
-            return jsonify({'error': 'Missing required fields'}), 400
-        
-        try:
-            # Validate date and time format
-            datetime.strptime(f"{data['date']} {data['time']}", '%d/%m/%Y %H:%M')
-            
-            # Validate categories
-            categories = data['categories'].split(',')
-            valid_categories = {'all', 'foundation', 'diploma', 'bsc', 'bs'}
-            if not all(cat.strip() in valid_categories for cat in categories):
-                print(f"Invalid categories: {categories}")
-                return jsonify({'error': 'Invalid categories'}), 400
-                
-        except ValueError as e:
-            print(f"Date/time validation error: {str(e)}")
-            return jsonify({'error': 'Invalid date or time format'}), 400
-
-        db = get_db()
-        cursor = db.cursor()
+        error = validate_reminder(data)
+        if error:
+            return jsonify({'error': error}), 400
+
         try:
-            cursor.execute(
-                'INSERT INTO reminders (date, time, message, categories) VALUES (?, ?, ?, ?)',
-                (data['date'], data['time'], data['message'], data['categories'])
+            get_database().add_reminder(
+                data['date'], data['time'], data['message'], data['categories'], data.get('recurrence')
             )
-            db.commit()
-            print(f"Successfully added reminder: {data}")
+            logger.info("Successfully added reminder: %s", data)
+            notify_reminders_changed()
         except sqlite3.Error as e:
-            print(f"Database error: {str(e)}")
+            logger.error("Database error: %s", e)
             return jsonify({'error': f'Database error: {str(e)}'}), 500
-        finally:
-            db.close()
-        
+
         return jsonify({'message': 'Reminder added successfully'}), 201
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
-@app.route('/api/reminders/<int:reminder_id>', methods=['DELETE'])
+def read_bulk_rows(stream, content_type):
+    """Yield (line number, row) pairs from a CSV or JSON Lines body without reading it all at once"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if content_type in ('text/csv', 'application/csv'):
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+@api.route('/api/reminders/bulk', methods=['POST'])
+@requires_auth
+def bulk_add_reminders():
+    """Import many reminders from a streamed CSV or JSON Lines body in a single transaction"""
+    if request.mimetype not in BULK_CONTENT_TYPES:
+        return jsonify({'error': f"Content-Type must be one of {', '.join(sorted(BULK_CONTENT_TYPES))}"}), 415
+
+    errors = []
+    error_count = 0
+    # Line of the row being inserted; rows are read lazily, so it is current when the database rejects one
+    current_line = 0
+
+    def reject(line_number, error):
+        nonlocal error_count
+        error_count += 1
+        # Keep the response bounded however broken the upload is
+        if len(errors) < MAX_BULK_ERRORS:
+            errors.append({'line': line_number, 'error': error})
+
+    def valid_rows():
+        nonlocal current_line
+        for line_number, row in read_bulk_rows(request.stream, request.mimetype):
+            error = 'Invalid JSON' if row is None else validate_reminder(row)
+            if error:
+                reject(line_number, error)
+                continue
+            current_line = line_number
+            yield row['date'], row['time'], row['message'], row['categories'], row.get('recurrence')
+
+    def row_failed(error):
+        logger.debug("Bulk import row on line %s rejected by the database: %s", current_line, error)
+        reject(current_line, f'Database error: {error}')
+
+    try:
+        inserted = get_database().add_reminders(valid_rows(), on_error=row_failed)
+    except sqlite3.Error as e:
+        logger.error("Database error: %s", e)
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Body must be UTF-8 encoded'}), 400
+
+    logger.info("Bulk import added %d reminders, rejected %d rows", inserted, error_count)
+    if inserted:
+        notify_reminders_changed()
+    status = 201 if inserted or not error_count else 400
+    return jsonify({'inserted': inserted, 'error_count': error_count, 'errors': errors}), status
+
+@api.route('/api/reminders/<int:reminder_id>', methods=['DELETE'])
 @requires_auth
 def delete_reminder(reminder_id):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute('DELETE FROM reminders WHERE id = ?', (reminder_id,))
-    db.commit()
-    db.close()
+    get_database().delete_reminder(reminder_id)
+    notify_reminders_changed()
     return '', 204
 
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
 @requires_auth
 def get_stats():
-    db = get_db()
-    cursor = db.cursor()
-    
-    # Get counts by category
-    cursor.execute('''
-        SELECT category, COUNT(*) as count 
-        FROM users 
-        GROUP BY category
-    ''')
-    user_stats = cursor.fetchall()
-    
-    # Get total reminders
-    cursor.execute('SELECT COUNT(*) as count FROM reminders')
-    reminder_count = cursor.fetchone()['count']
-    
-    db.close()
-    
-    return jsonify({
-        'user_stats': user_stats,
-        'total_reminders': reminder_count
-    })
+    # Counts are kept up to date by triggers, so this never scans users or reminders
+    try:
+        days = min(max(int(request.args.get('days', DEFAULT_STATS_DAYS)), 1), MAX_STATS_DAYS)
+    except ValueError:
+        return jsonify({'error': 'Invalid days'}), 400
+    return jsonify(get_database().get_stats(days))
+
+@api.route('/api/forecast', methods=['GET'])
+@requires_auth
+def get_forecast():
+    """Dry run: when each broadcast in the next `days` days would start and finish, with warnings
+
+    Pass date, time and categories (plus optionally message and recurrence)
+    to see how a reminder that has not been saved yet would fit in.
+    """
+    try:
+        days = min(max(int(request.args.get('days', DEFAULT_FORECAST_DAYS)), 1), MAX_FORECAST_DAYS)
+        rate = float(request.args['rate']) if request.args.get('rate') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid days or rate'}), 400
+    if rate is not None and rate <= 0:
+        return jsonify({'error': 'Invalid days or rate'}), 400
+
+    candidate = None
+    if 'date' in request.args or 'time' in request.args:
+        data = {key: request.args.get(key) for key in ('date', 'time', 'message', 'categories', 'recurrence')}
+        data['message'] = data['message'] or 'Forecast'
+        data['categories'] = data['categories'] or 'all'
+        error = validate_reminder({key: value for key, value in data.items() if value is not None})
+        if error:
+            return jsonify({'error': error}), 400
+        candidate = candidate_reminder(data['date'], data['time'], data['categories'], data['message'], data['recurrence'])
+
+    return jsonify(forecast(get_database(), days, rate, candidate=candidate))
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label with the view name, without the blueprint prefix
+        endpoint = (request.endpoint or 'unknown').rpartition('.')[2]
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+@api.teardown_app_request
+def release_connection(exception=None):
+    """Close this request's database connection, as the threaded server starts a new thread per request"""
+    database = current_app.extensions.get('database')
+    if database is not None:
+        database.pool.release()
+
+@api.route('/metrics')
+@requires_auth
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@api.after_app_request
+def compress_response(response):
+    """Gzip larger JSON responses for clients that accept it"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.mimetype != 'application/json'
+        or 'Content-Encoding' in response.headers
+        or 'gzip' not in request.headers.get('Accept-Encoding', '')
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def create_app(database_path: str = DATABASE_PATH) -> Flask:
+    """Build the admin web app, reading config/.env and setting up logging first
+
+    The database is opened by the first request that needs it.
+    """
+    # Load environment variables
+    load_dotenv('config/.env')
+    # Configure logging
+    configure_logging()
+    if not os.getenv('WEB_USERNAME') or not os.getenv('WEB_PASSWORD'):
+        raise ValueError("WEB_USERNAME and WEB_PASSWORD must be set in config/.env")
+
+    app = Flask(__name__)
+    app.config['DATABASE_PATH'] = database_path
+    app.register_blueprint(api)
+    return app
+
+_app: Optional[Flask] = None
+
+def get_app() -> Flask:
+    """The app served by `python web_server.py` and `web_server:app`, built on first use"""
+    global _app
+    if _app is None:
+        startup_profile.mark('imports')
+        _app = create_app()
+        startup_profile.mark('app')
+        startup_profile.report('Web server')
+    return _app
+
+def __getattr__(name):
+    # Module-level `app` for WSGI servers and Vercel deployment, built when the server looks it up
+    # rather than whenever the module is imported
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
     # For production deployment
-    app.run(host='0.0.0.0', port=5002, debug=False)
-else:
-    # For Vercel deployment
-    app = app
+    get_app().run(host='0.0.0.0', port=5002, debug=False)